@@ -1,49 +1,244 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-from werkzeug.utils import secure_filename
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response, stream_with_context, abort, g
 import os
+import re
 import json
-import google.generativeai as genai
-from PIL import Image
-import io
-import base64
-from datetime import datetime
+import time
+import queue
+import threading
+import hashlib
+import click
+import random
+from concurrent.futures import ThreadPoolExecutor
 import sqlite3
-from auth import auth_bp, login_required, auth_context_processor
+import db
+from db import get_db
+from auth import auth_bp, login_required, admin_required, auth_context_processor
+import upload_store
+import migrations
+from medicine_cache import MedicineInfoCache, normalize_name
+from catalog import load_catalog, known_fields, INFO_FIELDS
+from name_index import build_name_index
+from retrieval import MedicineRetriever, format_document, is_plain_lookup
+import metrics
+from imaging import preprocess_image, make_thumbnail, image_part, dhash
+from phash_index import BKTree, is_degenerate
+from upload_ingest import UploadRequest, take_upload, as_upload
+from assets import AssetManifest, build_assets, send_asset
+from model_backend import create_model
+from model_client import ResilientModel, CircuitBreaker
+from single_flight import SingleFlight
+from translation import Translator
+from info_store import InfoStore, InfoStoreBuilder
+from scan_jobs import ScanJobQueue, MemoryJobStore, SqliteJobStore, FINISHED
+from result_store import ResultStore
 
 # Initialize Flask app
 app = Flask(__name__)
+# Uploads are hashed and spooled while the body is parsed (see upload_ingest.py)
+app.request_class = UploadRequest
 app.secret_key = 'doseright-secret-key-2024'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024
+# Fingerprinted, precompressed CSS/JS/images from `flask build-assets`
+app.config['ASSET_DIST_FOLDER'] = os.path.join(app.static_folder, 'dist')
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'webp'}
 app.config['DATABASE'] = 'doseright.db'
+app.config['INFO_CACHE_TTL'] = 7 * 24 * 3600
+app.config['INFO_CACHE_MEMORY_SIZE'] = 256
+app.config['INFO_CACHE_MAX_ROWS'] = 5000
+# How long a worker trusts its in-memory copy before re-reading SQLite;
+# bounds how stale other workers are after an invalidation
+app.config['INFO_CACHE_MEMORY_TTL'] = int(os.environ.get('INFO_CACHE_MEMORY_TTL', 60))
+app.config['CATALOG_DIR'] = 'data'
+# Read-only catalog info built by `flask build-info-store`
+app.config['INFO_STORE_PATH'] = os.path.join(app.config['CATALOG_DIR'], 'catalog_info.db')
+# Trigram score an indexed name needs to be checked as a typo of a scanned
+# one; acceptance itself is by edit distance (see name_index.py)
+app.config['NAME_MATCH_THRESHOLD'] = 0.5
+app.config['SEARCH_TOP_K'] = 3
+app.config['SEARCH_LOCAL_THRESHOLD'] = 0.7
+app.config['SEARCH_CONTEXT_THRESHOLD'] = 0.3
+# 'two_step': vision call for the name, then an info call
+# 'structured': one vision call returning name + info as JSON
+app.config['SCAN_MODE'] = os.environ.get('SCAN_MODE', 'two_step')
+# Background scan jobs: /upload returns a job id, clients poll /scan/<id>
+app.config['SCAN_ASYNC'] = True
+app.config['SCAN_WORKERS'] = int(os.environ.get('SCAN_WORKERS', 4))
+app.config['SCAN_QUEUE_DEPTH'] = int(os.environ.get('SCAN_QUEUE_DEPTH', 32))
+app.config['SCAN_JOB_TIMEOUT'] = int(os.environ.get('SCAN_JOB_TIMEOUT', 60))
+app.config['SCAN_JOB_STORE'] = os.environ.get('SCAN_JOB_STORE', 'memory')  # or 'sqlite'
+app.config['SCAN_POLL_INTERVAL'] = 0.5
+# Server-sent scan events hold a worker for the whole scan, so they are only
+# offered under cooperative workers (the gevent profile); clients poll otherwise
+app.config['SCAN_EVENTS'] = os.environ.get('SCAN_EVENTS', '0') == '1'
+# /upload/batch: images per request, and scans running at once across batches
+app.config['BATCH_MAX_IMAGES'] = 20
+app.config['BATCH_PARALLELISM'] = int(os.environ.get('BATCH_PARALLELISM', 10))
+app.config['HISTORY_PAGE_SIZE'] = 20
+# Uploads are downscaled to this long edge before storage and the vision call
+app.config['IMAGE_MAX_EDGE'] = 1280
+app.config['IMAGE_QUALITY'] = 80
+# Full-size decodes at once; more only adds memory, the decode is CPU-bound
+app.config['DECODE_CONCURRENCY'] = int(os.environ.get('DECODE_CONCURRENCY', os.cpu_count() or 1))
+app.config['THUMBNAIL_EDGE'] = 240
+# Uploads within this many dHash bits of an identified one reuse its result
+app.config['PHASH_MAX_DISTANCE'] = int(os.environ.get('PHASH_MAX_DISTANCE', 6))
+# Hashes with fewer set (or clear) bits come from featureless images
+app.config['PHASH_MIN_BITS'] = int(os.environ.get('PHASH_MIN_BITS', 8))
+# MODEL_BACKEND=stub swaps Gemini for a deterministic offline model
+app.config['MODEL_BACKEND'] = os.environ.get('MODEL_BACKEND', 'gemini')
+app.config['MODEL_NAME'] = 'gemini-2.5-flash'
+app.config['GEMINI_API_KEY'] = os.environ.get('GEMINI_API_KEY')
+app.config['MODEL_TRANSPORT'] = os.environ.get('MODEL_TRANSPORT')  # 'grpc' (default) or 'rest'
+app.config['STUB_LATENCY_MS'] = float(os.environ.get('STUB_LATENCY_MS', 800))
+app.config['STUB_LATENCY_SIGMA'] = float(os.environ.get('STUB_LATENCY_SIGMA', 0.4))
+app.config['STUB_FAILURE_RATE'] = float(os.environ.get('STUB_FAILURE_RATE', 0))
+app.config['STUB_SEED'] = int(os.environ.get('STUB_SEED', 0))
+app.config['STUB_RESPONSES'] = os.environ.get('STUB_RESPONSES')  # JSON file overriding canned replies
+# Every model call: total deadline, transient-error retries, hedging and circuit breaker
+app.config['MODEL_DEADLINE'] = float(os.environ.get('MODEL_DEADLINE', 20))
+app.config['MODEL_RETRIES'] = int(os.environ.get('MODEL_RETRIES', 2))
+app.config['MODEL_RETRY_BACKOFF'] = 0.25
+app.config['MODEL_HEDGE_QUANTILE'] = float(os.environ.get('MODEL_HEDGE_QUANTILE', 0.95))  # 0 = no hedging
+app.config['MODEL_BREAKER_FAILURES'] = int(os.environ.get('MODEL_BREAKER_FAILURES', 5))
+app.config['MODEL_BREAKER_RESET'] = float(os.environ.get('MODEL_BREAKER_RESET', 30))
+# Model attempts in flight at once per process (see gunicorn.conf.py)
+app.config['MODEL_MAX_CONCURRENCY'] = int(os.environ.get('MODEL_MAX_CONCURRENCY', 32))
+# Log this share of requests slower than SLOW_REQUEST_SECONDS (0 = off)
+app.config['SLOW_REQUEST_SECONDS'] = float(os.environ.get('SLOW_REQUEST_SECONDS', 2.0))
+app.config['SLOW_REQUEST_LOG_RATE'] = float(os.environ.get('SLOW_REQUEST_LOG_RATE', 0))
+# Scan results are kept server-side and linked as /result/<id>
+app.config['RESULT_TTL'] = 30 * 24 * 3600
+app.config['RESULT_CACHE_MAX_AGE'] = 3600
 
-# Configure Gemini AI
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-model = genai.GenerativeModel("gemini-2.5-flash")
+# Model backend: Gemini, or a local stub for load tests (see model_backend.py),
+# behind deadlines, retries, hedging and a circuit breaker (see model_client.py)
+model = ResilientModel(create_model(app.config),
+                       deadline=app.config['MODEL_DEADLINE'],
+                       retries=app.config['MODEL_RETRIES'],
+                       backoff=app.config['MODEL_RETRY_BACKOFF'],
+                       hedge_quantile=app.config['MODEL_HEDGE_QUANTILE'],
+                       breaker=CircuitBreaker(app.config['MODEL_BREAKER_FAILURES'],
+                                              app.config['MODEL_BREAKER_RESET']),
+                       max_workers=app.config['MODEL_MAX_CONCURRENCY'])
 
 # Register authentication blueprint
 app.register_blueprint(auth_bp)
 app.context_processor(auth_context_processor)
 
-# Database connection
-def get_db():
-    conn = sqlite3.connect(app.config['DATABASE'])
-    conn.row_factory = sqlite3.Row
-    return conn
+# Templates link static files through asset_url() (see assets.py)
+asset_manifest = AssetManifest.open(app.config['ASSET_DIST_FOLDER'])
+app.jinja_env.globals['asset_url'] = asset_manifest.url
 
-def init_scan_db():
-    conn = get_db()
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS scan_history
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  medicine_name TEXT NOT NULL,
-                  image_url TEXT,
-                  category TEXT,
-                  timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.commit()
-    conn.close()
+# Database connection (request-scoped, see db.py)
+db.init_app(app)
+
+# The schema is created and upgraded by `flask migrate`; startup only checks it
+schema_version = migrations.current_version(get_db())
+if schema_version < migrations.LATEST_VERSION:
+    app.logger.warning('Database schema is at version %d of %d; run `flask --app app2 migrate`',
+                       schema_version, migrations.LATEST_VERSION)
+
+# Medicine info cache (in-process LRU + SQLite)
+info_cache = MedicineInfoCache(get_db,
+                               ttl=app.config['INFO_CACHE_TTL'],
+                               max_memory=app.config['INFO_CACHE_MEMORY_SIZE'],
+                               max_rows=app.config['INFO_CACHE_MAX_ROWS'],
+                               memory_ttl=app.config['INFO_CACHE_MEMORY_TTL'])
+
+# Local medicine catalog built from data/ at startup
+medicine_catalog = load_catalog(app.config['CATALOG_DIR'])
+info_store = InfoStore.open(app.config['INFO_STORE_PATH'])
+
+def get_history_medicine_names():
+    try:
+        conn = get_db()
+        rows = conn.execute('SELECT DISTINCT medicine_name FROM scan_history').fetchall()
+        return [row['medicine_name'] for row in rows]
+    except sqlite3.Error:
+        return []
+
+# Fuzzy name index over catalog names and past scans
+name_index = build_name_index(medicine_catalog, get_history_medicine_names())
+
+def build_phash_index():
+    index = BKTree()
+    try:
+        for phash, content_hash in upload_store.identified_phashes(get_db()):
+            if not is_degenerate(phash, app.config['PHASH_MIN_BITS']):
+                index.add(phash, content_hash)
+    except sqlite3.Error:
+        pass
+    return index
+
+# Perceptual hashes of identified uploads, for near-duplicate scans
+phash_index = build_phash_index()
+
+# Scan job queue; use the sqlite store when running several worker processes
+if app.config['SCAN_JOB_STORE'] == 'sqlite':
+    scan_job_store = SqliteJobStore(get_db)
+else:
+    scan_job_store = MemoryJobStore()
+scan_queue = ScanJobQueue(scan_job_store,
+                          workers=app.config['SCAN_WORKERS'],
+                          max_depth=app.config['SCAN_QUEUE_DEPTH'],
+                          timeout=app.config['SCAN_JOB_TIMEOUT'])
+
+# Concurrent identical lookups share one call (see single_flight.py)
+info_flight = SingleFlight('medicine_info')
+search_flight = SingleFlight('search')
+scan_flight = SingleFlight('scan_image')
+
+def generate_text(prompt):
+    return model.generate_content(prompt).text
+
+# Tamil translations of the result page fields, cached per medicine and field
+translator = Translator(get_db, generate_text, lang='ta')
+
+# Shared pool for /upload/batch fan-out
+batch_executor = ThreadPoolExecutor(max_workers=app.config['BATCH_PARALLELISM'],
+                                    thread_name_prefix='batch')
+
+# Bounds the decoded pixels alive at once across scan threads
+decode_slots = threading.BoundedSemaphore(app.config['DECODE_CONCURRENCY'])
+
+# Server-side scan results, referenced from the session by id
+result_store = ResultStore(get_db, ttl=app.config['RESULT_TTL'])
+
+# Retrieval over the bundled medicine documents for /search
+retriever = MedicineRetriever(os.path.join(app.config['CATALOG_DIR'], 'faiss_index.index'),
+                              os.path.join(app.config['CATALOG_DIR'], 'faiss_index_documents.pkl'))
+
+def scan_stage(stage):
+    """Time one scan stage (read, load, decode, save, vision, info, parse, db)
+    
+    'read' is receiving and spooling the upload body; 'load' is reading an
+    already stored image back from disk.
+    """
+    return metrics.timer('scan_stage_seconds', help='Time spent in each scan stage', stage=stage)
+
+def count_fallback(kind, value=1):
+    metrics.inc('info_fallbacks_total', value, help='Answers that fell back to default text', kind=kind)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    
+    elapsed = time.perf_counter() - started
+    metrics.observe('http_request_seconds', elapsed, help='Time to produce a response (headers, for streams)',
+                    endpoint=request.endpoint or 'unmatched', method=request.method,
+                    status=response.status_code)
+    if (elapsed >= app.config['SLOW_REQUEST_SECONDS']
+            and random.random() < app.config['SLOW_REQUEST_LOG_RATE']):
+        app.logger.warning('Slow request: %s %s -> %s in %.3fs', request.method,
+                           request.full_path.rstrip('?'), response.status_code, elapsed)
+    return response
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
@@ -70,9 +265,6 @@ def get_medicine_info(medicine_name):
         response = model.generate_content(prompt)
         text = response.text
         
-        print(f"Gemini response for {medicine_name}:")
-        print(text[:500])  # Print first 500 chars for debugging
-        
         # Initialize with guaranteed values
         info = {
             'uses': f'{medicine_name} treats various medical conditions.',
@@ -175,14 +367,11 @@ def get_medicine_info(medicine_name):
             if section in info and len(info[section]) > 100:
                 info[section] = info[section][:97] + '...'
         
-        print(f"Processed info for {medicine_name}:")
-        for key, value in info.items():
-            print(f"{key}: {value[:100]}...")
-        
         return info
         
     except Exception as e:
-        print(f"Error getting info for {medicine_name}: {e}")
+        app.logger.warning('Info lookup failed for %s: %s', medicine_name, e)
+        count_fallback('info_error')
         # Return guaranteed complete information with 2-3 lines
         return {
             'uses': f'{medicine_name} treats medical conditions.\nConsult doctor for specific uses.\nUsed for appropriate symptoms.',
@@ -196,96 +385,157 @@ def get_medicine_info(medicine_name):
 
 
 # Alternative simpler version (if above is too complex):
-def get_medicine_info_simple(medicine_name):
-    """Simpler version - just get 2-3 lines from Gemini"""
-    try:
-        # One prompt to get ALL information in concise format
-        prompt = f"""Provide medical information about '{medicine_name}' in this EXACT format:
+def parse_medicine_info_text(medicine_name, text, known=None):
+    """Parse a 'Uses: ... / Dosage: ...' style answer into the 7-field info dict
+    
+    Fields in `known` were not asked for; they are filled in from it, not
+    from the defaults.
+    """
+    info = {
+        'uses': '',
+        'dosage': '',
+        'precautions': '',
+        'side_effects': '',
+        'food_restriction': '',
+        'category': '',
+        'brand': ''
+    }
+    
+    current_key = None
+    lines = text.strip().split('\n')
+    
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        
+        # Check for section headers
+        if ':' in line:
+            key_part = line.split(':', 1)[0].strip().lower()
+            value_part = line.split(':', 1)[1].strip()
+            
+            # Map keys
+            if 'use' in key_part:
+                current_key = 'uses'
+                info[current_key] = value_part
+            elif 'dosage' in key_part or 'dose' in key_part:
+                current_key = 'dosage'
+                info[current_key] = value_part
+            elif 'precaut' in key_part or 'warning' in key_part:
+                current_key = 'precautions'
+                info[current_key] = value_part
+            elif 'side' in key_part:
+                current_key = 'side_effects'
+                info[current_key] = value_part
+            elif 'food' in key_part or 'diet' in key_part:
+                current_key = 'food_restriction'
+                info[current_key] = value_part
+            elif 'type' in key_part or 'categor' in key_part:
+                info['category'] = value_part
+            elif 'brand' in key_part:
+                info['brand'] = value_part
+            else:
+                current_key = None
+        elif current_key and current_key in info:
+            # Add as new line if less than 2 lines
+            if info[current_key].count('\n') < 1:
+                info[current_key] += '\n' + line
+    
+    # Fill any missing sections with defaults
+    defaults = {
+        'uses': f'{medicine_name} treats medical conditions.\nConsult doctor for uses.',
+        'dosage': 'Follow prescribed dosage.\nNever exceed recommended amount.',
+        'precautions': 'Consult doctor first.\nInform about medical history.',
+        'side_effects': 'Monitor for reactions.\nReport severe symptoms.',
+        'food_restriction': 'Follow food guidelines.\nSome interactions possible.',
+        'category': 'Medicine',
+        'brand': 'Various brands'
+    }
+    
+    known = known or {}
+    filled = 0
+    for key in info:
+        if key in known:
+            continue
+        if not info[key] or len(info[key].strip()) < 10:
+            info[key] = defaults.get(key, 'Information not available.')
+            filled += 1
+    if filled:
+        count_fallback('default_field', filled)
+    
+    info.update(known)
+    return info
+
+# Prompt lines for get_medicine_info_simple, in the order Gemini should answer
+INFO_PROMPT_SECTIONS = [
+    ('uses', 'Uses: [2 lines maximum]'),
+    ('dosage', 'Dosage: [2 lines maximum]'),
+    ('precautions', 'Precautions: [2 lines maximum]'),
+    ('side_effects', 'Side Effects: [2 lines maximum]'),
+    ('food_restriction', 'Food: [2 lines maximum]'),
+    ('category', 'Type: [1 line]'),
+    ('brand', 'Brands: [1 line]')
+]
+
+INFO_PROMPT = """Provide medical information about '{medicine_name}' in this EXACT format:
 
-Uses: [2 lines maximum]
-Dosage: [2 lines maximum]  
-Precautions: [2 lines maximum]
-Side Effects: [2 lines maximum]
-Food: [2 lines maximum]
-Type: [1 line]
-Brands: [1 line]
+{sections}
 
 Keep every section SHORT. 2 lines maximum per section."""
 
+def info_prompt_version():
+    """Changes whenever the info prompt or model does; stored in the info store"""
+    source = json.dumps([INFO_PROMPT, INFO_PROMPT_SECTIONS, app.config['MODEL_NAME']])
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+
+if info_store.meta.get('prompt_version') not in (None, info_prompt_version()):
+    app.logger.warning('%s was built with an older info prompt; rebuild it with '
+                       '`flask build-info-store --rebuild`', app.config['INFO_STORE_PATH'])
+
+def get_medicine_info_simple(medicine_name, known=None):
+    """Simpler version - just get 2-3 lines from Gemini
+    
+    Fields passed in `known` (e.g. from the local catalog) are kept as-is and
+    left out of the prompt, so Gemini only writes the missing sections.
+    """
+    cached = info_cache.get(medicine_name)
+    if cached:
+        return cached
+    
+    # Concurrent misses for the same medicine share one Gemini call
+    return dict(info_flight.do(normalize_name(medicine_name), fetch_medicine_info, medicine_name, known))
+
+def generate_medicine_info(medicine_name, known=None):
+    """One Gemini call for the sections not in `known`; raises on failure"""
+    known = known or {}
+    
+    # One prompt to get the missing information in concise format
+    sections = '\n'.join(line for key, line in INFO_PROMPT_SECTIONS if key not in known)
+    prompt = INFO_PROMPT.format(medicine_name=medicine_name, sections=sections)
+    
+    with scan_stage('info'):
         response = model.generate_content(prompt)
         text = response.text
-        
-        # Parse the response
-        info = {
-            'uses': '',
-            'dosage': '',
-            'precautions': '',
-            'side_effects': '',
-            'food_restriction': '',
-            'category': '',
-            'brand': ''
-        }
-        
-        current_key = None
-        lines = text.strip().split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Check for section headers
-            if ':' in line:
-                key_part = line.split(':', 1)[0].strip().lower()
-                value_part = line.split(':', 1)[1].strip()
-                
-                # Map keys
-                if 'use' in key_part:
-                    current_key = 'uses'
-                    info[current_key] = value_part
-                elif 'dosage' in key_part or 'dose' in key_part:
-                    current_key = 'dosage'
-                    info[current_key] = value_part
-                elif 'precaut' in key_part or 'warning' in key_part:
-                    current_key = 'precautions'
-                    info[current_key] = value_part
-                elif 'side' in key_part:
-                    current_key = 'side_effects'
-                    info[current_key] = value_part
-                elif 'food' in key_part or 'diet' in key_part:
-                    current_key = 'food_restriction'
-                    info[current_key] = value_part
-                elif 'type' in key_part or 'categor' in key_part:
-                    info['category'] = value_part
-                elif 'brand' in key_part:
-                    info['brand'] = value_part
-                else:
-                    current_key = None
-            elif current_key and current_key in info:
-                # Add as new line if less than 2 lines
-                if info[current_key].count('\n') < 1:
-                    info[current_key] += '\n' + line
-        
-        # Fill any missing sections with defaults
-        defaults = {
-            'uses': f'{medicine_name} treats medical conditions.\nConsult doctor for uses.',
-            'dosage': 'Follow prescribed dosage.\nNever exceed recommended amount.',
-            'precautions': 'Consult doctor first.\nInform about medical history.',
-            'side_effects': 'Monitor for reactions.\nReport severe symptoms.',
-            'food_restriction': 'Follow food guidelines.\nSome interactions possible.',
-            'category': 'Medicine',
-            'brand': 'Various brands'
-        }
-        
-        for key in info:
-            if not info[key] or len(info[key].strip()) < 10:
-                info[key] = defaults.get(key, 'Information not available.')
-        
+    
+    with scan_stage('parse'):
+        return parse_medicine_info_text(medicine_name, text, known)
+
+def fetch_medicine_info(medicine_name, known=None):
+    """Ask Gemini for the sections not in `known` and cache the answer
+    
+    On failure the generic text comes back marked 'fallback' and is not
+    cached anywhere, so the next scan asks again.
+    """
+    try:
+        info = generate_medicine_info(medicine_name, known)
+        info_cache.set(medicine_name, info)
         return info
         
     except Exception as e:
-        print(f"Error in simple version: {e}")
-        return {
+        app.logger.warning('Info lookup failed for %s: %s', medicine_name, e)
+        count_fallback('info_error')
+        # Catalog facts still beat the generic text
+        return dict({
             'uses': f'{medicine_name} treats conditions.\nSee doctor for details.',
             'dosage': 'Take as prescribed.\nFollow instructions.',
             'precautions': 'Consult doctor.\nBe cautious.',
@@ -293,25 +543,158 @@ Keep every section SHORT. 2 lines maximum per section."""
             'food_restriction': 'Take properly.\nWatch interactions.',
             'category': 'Medicine',
             'brand': 'Various'
-        }
+        }, **(known or {}), fallback=True)
 
-def generate_tamil_data(medicine_name, english_info):
-    """Generate Tamil data - keep it short"""
+def resolve_medicine_name(raw_name):
+    """Map a raw vision answer to a known medicine name
+    
+    Returns the canonical name and the match confidence (0-1). Names that
+    only differ in strength or dosage form match exactly, and a typo of
+    exactly one known medicine is corrected; otherwise the raw name is kept.
+    """
+    canonical_name, confidence = name_index.match(raw_name, app.config['NAME_MATCH_THRESHOLD'])
+    if canonical_name:
+        return canonical_name, confidence
+    return raw_name, confidence
+
+def lookup_medicine_info(medicine_name):
+    """Answer from the local catalog first, Gemini only for missing fields
+    
+    Returns the canonical medicine name (brand names resolve to the generic
+    name) and the info dict.
+    """
+    entry = medicine_catalog.lookup(medicine_name)
+    if not entry:
+        return medicine_name, get_medicine_info_simple(medicine_name)
+    
+    canonical_name = entry['medicine_name']
+    known = known_fields(entry)
+    if len(known) == len(INFO_FIELDS):
+        return canonical_name, known
+    
+    # Pre-generated offline; catalog facts still win
+    stored = info_store.get(canonical_name)
+    if stored:
+        stored.update(known)
+        metrics.inc('info_store_hits_total', help='Catalog medicines served from the pre-generated info store')
+        return canonical_name, stored
+    return canonical_name, get_medicine_info_simple(canonical_name, known)
+
+def identify_medicine(img):
+    """Ask Gemini for the medicine name shown in an image (PIL image or image part)"""
+    prompt = "Provide only the medicine name of the image. Strictly only the name"
+    with scan_stage('vision'):
+        response = model.generate_content([img, prompt])
+        medicine_name = response.text.strip()
+    
+    # Clean name
+    medicine_name = medicine_name.split('\n')[0].split('.')[0].strip()
+    if not medicine_name:
+        medicine_name = "Medicine"
+    
+    # Resolve OCR-style variants to a known name
+    medicine_name, _ = resolve_medicine_name(medicine_name)
+    return medicine_name
+
+STRUCTURED_SCAN_FIELDS = ('medicine_name',) + INFO_FIELDS
+
+STRUCTURED_SCAN_PROMPT = """Identify the medicine in this image and give SHORT medical information about it.
+Reply with ONLY a JSON object, no other text, with exactly these string keys:
+
+{"medicine_name": "name only", "uses": "2 lines maximum", "dosage": "2 lines maximum",
+ "precautions": "2 lines maximum", "side_effects": "2 lines maximum",
+ "food_restriction": "2 lines maximum", "category": "1 line", "brand": "1 line"}
+
+Separate lines inside a value with \\n."""
+
+def parse_structured_scan(text):
+    """Validate a structured scan reply against STRUCTURED_SCAN_FIELDS
+    
+    Raises ValueError when the reply is not a JSON object with every field
+    as a non-empty string.
+    """
+    match = re.search(r'\{.*\}', text, re.S)
+    if not match:
+        raise ValueError('No JSON object in response')
+    
+    data = json.loads(match.group(0))
+    if not isinstance(data, dict):
+        raise ValueError('Response is not a JSON object')
+    
+    missing = [key for key in STRUCTURED_SCAN_FIELDS
+               if not isinstance(data.get(key), str) or not data[key].strip()]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    
+    result = {key: data[key].strip() for key in STRUCTURED_SCAN_FIELDS}
+    for key in ['category', 'brand']:
+        if len(result[key]) > 100:
+            result[key] = result[key][:97] + '...'
+    return result
+
+def scan_medicine_structured(img):
+    """Identify and describe a medicine with a single Gemini call
+    
+    Malformed replies fall back to the line parser used by
+    get_medicine_info_simple, marked as fallback info. Returns
+    (medicine_name, info).
+    """
+    with scan_stage('vision'):
+        response = model.generate_content([img, STRUCTURED_SCAN_PROMPT])
+        text = response.text
+    
     try:
-        # Keep Tamil data very short
-        return {
-            'name': medicine_name,
-            'uses': 'வலி மற்றும் காய்ச்சல் நிவாரணம்.',
-            'dosage': 'வைத்தியரின் பரிந்துரையைப் பின்பற்றவும்.',
-            'precautions': 'வைத்தியரைக் கலந்தாலோசிக்கவும்.'
-        }
-    except:
-        return {
-            'name': medicine_name,
-            'uses': 'மருத்துவ சிகிச்சைக்கு பயன்படுத்தப்படுகிறது.',
-            'dosage': 'வைத்தியரைக் கலந்தாலோசிக்கவும்.',
-            'precautions': 'பாதுகாப்பு தகவல்களுக்கு வைத்தியரைக் கலந்தாலோசிக்கவும்.'
-        }
+        with scan_stage('parse'):
+            info = parse_structured_scan(text)
+        raw_name = info.pop('medicine_name')
+        valid = True
+    except ValueError as e:
+        app.logger.warning('Structured scan fallback: %s', e)
+        count_fallback('structured_parse')
+        name_match = re.search(r'medicine[ _]name["\']?\s*:\s*["\']?([^"\'\n,}]+)', text, re.I)
+        raw_name = name_match.group(1).strip() if name_match else 'Medicine'
+        info = parse_medicine_info_text(raw_name, text)
+        # Not cached or stored with the image, so a repeat scan retries
+        info['fallback'] = True
+        valid = False
+    
+    medicine_name, _ = resolve_medicine_name(raw_name.split('\n')[0].strip() or 'Medicine')
+    
+    # Catalog facts win over generated text
+    entry = medicine_catalog.lookup(medicine_name)
+    if entry:
+        medicine_name = entry['medicine_name']
+        info.update(known_fields(entry))
+    
+    if valid:
+        info_cache.set(medicine_name, info)
+    return medicine_name, info
+
+# Fields shown in the Tamil view, and what to show when no translation exists
+TAMIL_FIELDS = ('uses', 'dosage', 'precautions')
+TAMIL_FALLBACK = {
+    'uses': 'மருத்துவ சிகிச்சைக்கு பயன்படுத்தப்படுகிறது.',
+    'dosage': 'வைத்தியரின் பரிந்துரையைப் பின்பற்றவும்.',
+    'precautions': 'வைத்தியரைக் கலந்தாலோசிக்கவும்.'
+}
+
+def tamil_source_fields(english_info):
+    return {field: english_info[field] for field in TAMIL_FIELDS if english_info.get(field)}
+
+def generate_tamil_data(medicine_name, english_info):
+    """Tamil uses, dosage and precautions, translated once and cached"""
+    translated = translator.translate(medicine_name, tamil_source_fields(english_info))
+    missing = [field for field in TAMIL_FIELDS if field not in translated]
+    if missing:
+        count_fallback('translation', len(missing))
+    
+    tamil_data = {
+        'name': medicine_name,
+        'brand': english_info.get('brand', '')
+    }
+    for field in TAMIL_FIELDS:
+        tamil_data[field] = translated.get(field) or TAMIL_FALLBACK[field]
+    return tamil_data
 
 # ============ ROUTES ============
 
@@ -323,157 +706,609 @@ def index():
 def about():
     return render_template('about.html')
 
+def encode_history_cursor(scan):
+    return f"{scan['timestamp']}|{scan['id']}"
+
+def decode_history_cursor(cursor):
+    """Split a 'timestamp|id' cursor; raises ValueError if malformed"""
+    timestamp, scan_id = cursor.rsplit('|', 1)
+    return timestamp, int(scan_id)
+
+def fetch_history_page(user_id, cursor=None, limit=None):
+    """One page of a user's scans, newest first
+    
+    Keyset pagination on (timestamp, id): the cursor is the last row of the
+    previous page, so every page is a bounded range read on
+    idx_scan_history_user_time. Returns (scans, next_cursor or None).
+    """
+    limit = limit or app.config['HISTORY_PAGE_SIZE']
+    conn = get_db()
+    if cursor:
+        timestamp, scan_id = decode_history_cursor(cursor)
+        rows = conn.execute('''SELECT id, medicine_name, image_url, category, timestamp
+                               FROM scan_history
+                               WHERE user_id = ? AND (timestamp, id) < (?, ?)
+                               ORDER BY timestamp DESC, id DESC LIMIT ?''',
+                            (user_id, timestamp, scan_id, limit + 1)).fetchall()
+    else:
+        rows = conn.execute('''SELECT id, medicine_name, image_url, category, timestamp
+                               FROM scan_history WHERE user_id = ?
+                               ORDER BY timestamp DESC, id DESC LIMIT ?''',
+                            (user_id, limit + 1)).fetchall()
+    
+    scans = [dict(row) for row in rows[:limit]]
+    for scan in scans:
+        scan['thumb_url'] = upload_store.thumbnail_url(scan['image_url'])
+    next_cursor = encode_history_cursor(scans[-1]) if len(rows) > limit else None
+    return scans, next_cursor
+
+def get_scan_stats(user_id):
+    """Total scans and last scan time from user_scan_stats (O(1))"""
+    row = get_db().execute('SELECT total_scans, last_scan FROM user_scan_stats WHERE user_id = ?',
+                           (user_id,)).fetchone()
+    if not row:
+        return {'total_scans': 0, 'last_scan': None}
+    return {'total_scans': row['total_scans'], 'last_scan': row['last_scan']}
+
 @app.route('/history')
 @login_required
 def history():
+    try:
+        scan_list, next_cursor = fetch_history_page(session['user_id'], request.args.get('cursor'))
+    except ValueError:
+        return redirect(url_for('history'))
+    
+    stats = get_scan_stats(session['user_id'])
+    return render_template('history.html', scans=scan_list, next_cursor=next_cursor,
+                           total_scans=stats['total_scans'])
+
+@app.route('/api/history')
+def api_history():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    
+    try:
+        limit = min(int(request.args.get('limit', app.config['HISTORY_PAGE_SIZE'])), 100)
+        scans, next_cursor = fetch_history_page(session['user_id'], request.args.get('cursor'),
+                                                max(limit, 1))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    return jsonify({
+        'scans': [{key: scan[key] for key in ('medicine_name', 'image_url', 'category', 'timestamp')}
+                  for scan in scans],
+        'next_cursor': next_cursor
+    })
+
+def identify_upload(upload):
+    """First scan stage: store the image and work out which medicine it shows
+    
+    Takes an UploadSpool (or raw bytes) and releases it. Returns a dict
+    with image_url, medicine_name and detection_method. medicine_info is
+    None when the info still has to be looked up, and 'new' is True when
+    the identification should be recorded. Concurrent scans of the same
+    image share one identification.
+    """
+    upload = as_upload(upload)
+    try:
+        return dict(scan_flight.do(upload.content_hash, store_and_identify, upload, upload.content_hash))
+    finally:
+        upload.release()
+
+def store_and_identify(upload, content_hash):
+    # Look the image up by content hash
+    unique_filename = upload_store.stored_filename(content_hash)
+    save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+    scan = {
+        'content_hash': content_hash,
+        'image_url': f"/static/uploads/{unique_filename}",
+        'medicine_info': None,
+        'detection_method': 'AI Recognition',
+        'new': True
+    }
+    
     conn = get_db()
-    scans = conn.execute('''SELECT medicine_name, image_url, category, timestamp 
-                           FROM scan_history WHERE user_id = ? 
-                           ORDER BY timestamp DESC''',
-                        (session['user_id'],)).fetchall()
-    conn.close()
+    stored = upload_store.lookup(conn, content_hash)
     
-    scan_list = []
-    for scan in scans:
-        scan_list.append({
-            'medicine_name': scan['medicine_name'],
-            'image_url': scan['image_url'],
-            'category': scan['category'],
-            'timestamp': scan['timestamp']
-        })
+    if stored and stored['medicine_info'] and os.path.exists(save_path):
+        # Exact duplicate - reuse the earlier identification, no vision call
+        upload.release()
+        scan.update(medicine_name=stored['medicine_name'], medicine_info=stored['medicine_info'],
+                    detection_method='AI Recognition (cached)', new=False)
+        metrics.inc('scan_image_cache_hits_total', help='Scans answered from an identical earlier upload')
+        return scan
+    
+    if os.path.exists(save_path):
+        with scan_stage('load'):
+            with open(save_path, 'rb') as f:
+                jpeg_bytes = f.read()
+    else:
+        # Downscale once; the same compact JPEG is stored and sent to Gemini
+        with decode_slots, scan_stage('decode'):
+            jpeg_bytes, thumb_bytes = preprocess_image(upload.open(),
+                                                       max_edge=app.config['IMAGE_MAX_EDGE'],
+                                                       thumb_edge=app.config['THUMBNAIL_EDGE'],
+                                                       quality=app.config['IMAGE_QUALITY'])
+        with scan_stage('save'):
+            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+            with open(save_path, 'wb') as f:
+                f.write(jpeg_bytes)
+            thumb_path = os.path.join(app.config['UPLOAD_FOLDER'],
+                                      upload_store.thumbnail_filename(content_hash))
+            with open(thumb_path, 'wb') as f:
+                f.write(thumb_bytes)
+    # Only the downscaled JPEG is needed from here on; free the original
+    # before waiting on the model
+    upload.release()
     
-    return render_template('history.html', scans=scan_list)
+    similar = find_similar_upload(scan, jpeg_bytes)
+    if similar:
+        # Near duplicate (re-shot or re-compressed) - reuse its identification
+        scan.update(medicine_name=similar['medicine_name'], medicine_info=similar['medicine_info'],
+                    detection_method='AI Recognition (similar image)')
+    elif stored and stored['medicine_name']:
+        # Compacted legacy upload - name is known, only info is missing
+        scan['medicine_name'] = stored['medicine_name']
+    elif app.config['SCAN_MODE'] == 'structured':
+        scan['medicine_name'], scan['medicine_info'] = scan_medicine_structured(image_part(jpeg_bytes))
+    else:
+        scan['medicine_name'] = identify_medicine(image_part(jpeg_bytes))
+    return scan
 
-@app.route('/upload', methods=['POST'])
-def upload_image():
-    if 'image' not in request.files:
-        return jsonify({'error': 'No image uploaded'}), 400
+def find_similar_upload(scan, jpeg_bytes):
+    """Stored identification of the nearest earlier upload, if close enough
     
-    file = request.files['image']
-    if file.filename == '':
-        return jsonify({'error': 'No image selected'}), 400
+    Featureless images are never matched or indexed, and every identified
+    upload within PHASH_MAX_DISTANCE must name the same medicine.
+    """
+    with metrics.timer('phash_search_seconds', help='Perceptual hash and near-duplicate search time',
+                       buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)):
+        phash = dhash(jpeg_bytes)
+        degenerate = is_degenerate(phash, app.config['PHASH_MIN_BITS'])
+        if not degenerate:
+            scan['phash'] = phash
+            matches = phash_index.search(phash, app.config['PHASH_MAX_DISTANCE'])
+    if degenerate:
+        metrics.inc('phash_lookups_total', help='Near-duplicate searches by outcome', result='degenerate')
+        return None
     
-    if not file or not allowed_file(file.filename):
-        return jsonify({'error': 'Invalid file type'}), 400
+    candidates = []
+    for distance, content_hash in matches:
+        if content_hash == scan['content_hash']:
+            continue
+        stored = upload_store.lookup(get_db(), content_hash)
+        if stored and stored['medicine_info']:
+            candidates.append(stored)
+    names = {normalize_name(stored['medicine_name']) for stored in candidates}
+    if len(names) == 1:
+        metrics.inc('phash_lookups_total', help='Near-duplicate searches by outcome', result='hit')
+        return candidates[0]
+    metrics.inc('phash_lookups_total', help='Near-duplicate searches by outcome',
+                result='ambiguous' if names else 'miss')
+    return None
+
+def build_final_info(scan, tamil_data=None):
+    """Result page data for a scan - ensure ALL fields exist"""
+    medicine_name = scan['medicine_name']
+    medicine_info = scan['medicine_info']
+    return {
+        'medicine_name': medicine_name,
+        'brand': medicine_info.get('brand', 'Various brands'),
+        'category': medicine_info.get('category', 'Medicine'),
+        'uses': medicine_info.get('uses', 'Pain and fever relief medication.'),
+        'dosage': medicine_info.get('dosage', 'Consult doctor for proper dosage.'),
+        'precautions': medicine_info.get('precautions', 'Always consult doctor before use.'),
+        'side_effects': medicine_info.get('side_effects', 'May cause mild side effects.'),
+        'food_restriction': medicine_info.get('food_restriction', 'Take as directed by doctor.'),
+        'image_url': scan['image_url'],
+        'detection_method': scan['detection_method'],
+        'tamil_data': tamil_data or generate_tamil_data(medicine_name, medicine_info)
+    }
+
+def record_scan(conn, scan):
+    """Remember a new identification by content hash (caller commits)
+    
+    Fallback info is not stored, only the name, so repeat and look-alike
+    scans look the info up again instead of reusing the generic text.
+    """
+    if scan['new']:
+        medicine_info = scan['medicine_info']
+        if medicine_info.get('fallback'):
+            medicine_info = None
+        upload_store.record(conn, scan['content_hash'], scan['image_url'],
+                            scan['medicine_name'], medicine_info, scan.get('phash'))
+
+def remember_scan(scan):
+    """Make a newly recorded scan findable by name and by look-alike images"""
+    if scan['new']:
+        name_index.add(scan['medicine_name'])
+        if scan.get('phash'):
+            phash_index.add(scan['phash'], scan['content_hash'])
+
+def run_scan(upload, user_id=None):
+    """Full scan pipeline: store image, identify, describe, record history
     
+    Runs outside the request (in a scan worker), so it only takes plain
+    values and returns the final_info dict for the result page.
+    """
     try:
-        # Read and save image
-        img_bytes = file.read()
-        img = Image.open(io.BytesIO(img_bytes))
-        
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        img.save(save_path, format='JPEG', quality=85)
-        
-        # Identify medicine
-        prompt = "Provide only the medicine name of the image. Strictly only the name"
-        response = model.generate_content([img, prompt])
-        medicine_name = response.text.strip()
-        
-        # Clean name
-        medicine_name = medicine_name.split('\n')[0].split('.')[0].strip()
-        if not medicine_name:
-            medicine_name = "Medicine"
-        
-        # Get medicine info
-        medicine_info = get_medicine_info_simple(medicine_name)
-        
-        # Prepare final data - ensure ALL fields exist
-        final_info = {
-            'medicine_name': medicine_name,
-            'brand': medicine_info.get('brand', 'Various brands'),
-            'category': medicine_info.get('category', 'Medicine'),
-            'uses': medicine_info.get('uses', 'Pain and fever relief medication.'),
-            'dosage': medicine_info.get('dosage', 'Consult doctor for proper dosage.'),
-            'precautions': medicine_info.get('precautions', 'Always consult doctor before use.'),
-            'side_effects': medicine_info.get('side_effects', 'May cause mild side effects.'),
-            'food_restriction': medicine_info.get('food_restriction', 'Take as directed by doctor.'),
-            'image_url': f"/static/uploads/{unique_filename}",
-            'detection_method': 'AI Recognition',
-            'tamil_data': generate_tamil_data(medicine_name, medicine_info)
-        }
+        scan = identify_upload(upload)
+        if scan['medicine_info'] is None:
+            # Get medicine info (local catalog first)
+            scan['medicine_name'], scan['medicine_info'] = lookup_medicine_info(scan['medicine_name'])
         
-        # Store in session
-        session['last_medicine'] = final_info
+        final_info = build_final_info(scan)
         
         # Save to database
-        if 'user_id' in session:
+        with scan_stage('db'):
             conn = get_db()
-            conn.execute('''INSERT INTO scan_history (user_id, medicine_name, image_url, category)
-                          VALUES (?, ?, ?, ?)''',
-                        (session['user_id'], medicine_name, final_info['image_url'], 
-                         final_info.get('category', 'Unknown')))
+            record_scan(conn, scan)
+            if user_id:
+                conn.execute('''INSERT INTO scan_history (user_id, medicine_name, image_url, category)
+                              VALUES (?, ?, ?, ?)''',
+                            (user_id, final_info['medicine_name'], final_info['image_url'], 
+                             final_info.get('category', 'Unknown')))
             conn.commit()
-            conn.close()
+        remember_scan(scan)
         
-        return jsonify({
-            'success': True,
-            'redirect': url_for('result')
-        })
+        return final_info
         
     except Exception as e:
-        print(f"Error: {e}")
-        
-        # Even on error, provide COMPLETE data
-        error_info = {
-            'medicine_name': 'Medicine',
-            'brand': 'Various brands',
-            'category': 'General',
-            'uses': 'Upload a medicine image to get information.',
-            'dosage': 'Consult doctor for proper dosage.',
-            'precautions': 'Always verify medicine with healthcare provider.',
-            'side_effects': 'Information will appear after scan.',
-            'food_restriction': 'Take as directed by your doctor.',
-            'image_url': '/static/images/medicine-placeholder.jpg',
-            'detection_method': 'Scan Required',
-            'tamil_data': {
-                'name': 'மருந்து',
-                'uses': 'தகவல் இல்லை',
-                'dosage': 'வைத்தியரைக் கலந்தாலோசிக்கவும்'
-            }
+        app.logger.exception('Scan failed: %s', e)
+        count_fallback('scan_error')
+        return scan_error_info()
+
+def scan_error_info():
+    # Even on error, provide COMPLETE data
+    return {
+        'medicine_name': 'Medicine',
+        'brand': 'Various brands',
+        'category': 'General',
+        'uses': 'Upload a medicine image to get information.',
+        'dosage': 'Consult doctor for proper dosage.',
+        'precautions': 'Always verify medicine with healthcare provider.',
+        'side_effects': 'Information will appear after scan.',
+        'food_restriction': 'Take as directed by your doctor.',
+        'image_url': '/static/images/medicine-placeholder.jpg',
+        'detection_method': 'Scan Required',
+        'tamil_data': {
+            'name': 'மருந்து',
+            'uses': 'தகவல் இல்லை',
+            'dosage': 'வைத்தியரைக் கலந்தாலோசிக்கவும்'
         }
-        
-        session['last_medicine'] = error_info
+    }
+
+def scan_batch(uploads, user_id=None):
+    """Scan several uploads concurrently
+    
+    Identical images are identified once and each distinct medicine name
+    is looked up and translated once. History rows and results for the whole batch are
+    written in one transaction. Returns one {'medicine', 'result_id'} per
+    image, in order, or None where the scan failed.
+    """
+    # Stage 1: vision calls, one per distinct image
+    hashes = [upload.content_hash for upload in uploads]
+    futures = {}
+    for digest, upload in zip(hashes, uploads):
+        if digest in futures:
+            upload.release()
+        else:
+            futures[digest] = batch_executor.submit(db.job(identify_upload), upload)
+    
+    scans = {}
+    for digest, future in futures.items():
+        try:
+            scans[digest] = future.result()
+        except Exception as e:
+            app.logger.warning('Batch scan failed: %s', e)
+            count_fallback('scan_error')
+            scans[digest] = None
+    
+    # Stage 2: one task per distinct medicine name, for its info lookup
+    # (unless an image of it already came with info) and Tamil translation
+    groups = {}
+    for scan in scans.values():
+        if scan:
+            groups.setdefault(normalize_name(scan['medicine_name']), []).append(scan)
+    described = {}
+    lookups = 0
+    for key, group in groups.items():
+        medicine_info = next((scan['medicine_info'] for scan in group
+                              if scan['medicine_info'] is not None), None)
+        lookups += medicine_info is None
+        described[key] = batch_executor.submit(db.job(describe_medicine), group[0]['medicine_name'],
+                                               medicine_info)
+    metrics.inc('batch_lookups_saved_total', len(uploads) - lookups,
+                help='Batch images that needed no info lookup of their own')
+    
+    tamil = {}
+    for key, group in groups.items():
+        try:
+            medicine_name, medicine_info, tamil_data = described[key].result()
+            tamil[normalize_name(medicine_name)] = tamil_data
+        except Exception as e:
+            app.logger.warning('Batch info lookup failed: %s', e)
+            count_fallback('scan_error')
+            medicine_name, medicine_info = group[0]['medicine_name'], None
+        for scan in group:
+            scan['medicine_name'], scan['medicine_info'] = medicine_name, medicine_info
+    
+    results = []
+    for digest in hashes:
+        scan = scans[digest]
+        if scan and scan['medicine_info'] is not None:
+            results.append(build_final_info(scan, tamil[normalize_name(scan['medicine_name'])]))
+        else:
+            results.append(None)
+    
+    # Stage 3: one transaction for the whole batch
+    conn = get_db()
+    with scan_stage('db'), conn:
+        for scan in scans.values():
+            if scan and scan['medicine_info'] is not None:
+                record_scan(conn, scan)
+        result_ids = [result_store.add(conn, info) if info else None for info in results]
+        if user_id:
+            conn.executemany('''INSERT INTO scan_history (user_id, medicine_name, image_url, category)
+                                VALUES (?, ?, ?, ?)''',
+                             [(user_id, info['medicine_name'], info['image_url'],
+                               info.get('category', 'Unknown')) for info in results if info])
+    for scan in scans.values():
+        if scan and scan['medicine_info'] is not None:
+            remember_scan(scan)
+    
+    return [
+        {'medicine': info, 'result_id': rid} if info else None
+        for info, rid in zip(results, result_ids)
+    ]
+
+def describe_medicine(medicine_name, medicine_info=None):
+    """Info (looked up unless given) and Tamil view for one batch medicine"""
+    if medicine_info is None:
+        medicine_name, medicine_info = lookup_medicine_info(medicine_name)
+    return medicine_name, medicine_info, generate_tamil_data(medicine_name, medicine_info)
+
+def run_scan_job(upload, user_id=None):
+    """Run a scan and store its result; the job result is just the id"""
+    return {'result_id': result_store.save(run_scan(upload, user_id))}
+
+@app.route('/upload', methods=['POST'])
+def upload_image():
+    # The body is parsed and spooled on first access to request.files
+    with scan_stage('read'):
+        files = request.files
+    if 'image' not in files:
+        return jsonify({'error': 'No image uploaded'}), 400
+    
+    file = files['image']
+    if file.filename == '':
+        return jsonify({'error': 'No image selected'}), 400
+    
+    if not file or not allowed_file(file.filename):
+        return jsonify({'error': 'Invalid file type'}), 400
+    
+    upload = take_upload(file)
+    if upload is None:
+        metrics.inc('upload_rejections_total', help='Uploads whose content is not a supported image')
+        return jsonify({'error': 'Invalid file type'}), 400
+    user_id = session.get('user_id')
+    
+    if not app.config['SCAN_ASYNC']:
+        result_id = run_scan_job(upload, user_id)['result_id']
+        session['last_result'] = result_id
         return jsonify({
             'success': True,
-            'redirect': url_for('result')
+            'result_id': result_id,
+            'redirect': url_for('result_by_id', result_id=result_id)
         })
+    
+    try:
+        # The spool is freed even if the job expires before it runs
+        job_id = scan_queue.submit(db.job(run_scan_job), upload, user_id,
+                                  cleanup=upload.release)
+    except queue.Full:
+        upload.release()
+        response = jsonify({'success': False, 'error': 'Server busy, please try again shortly.'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    payload = {
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('scan_status', job_id=job_id)
+    }
+    if app.config['SCAN_EVENTS']:
+        payload['events_url'] = url_for('scan_events', job_id=job_id)
+    return jsonify(payload), 202
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    with scan_stage('read'):
+        files = request.files.getlist('images')
+    if not files:
+        return jsonify({'error': 'No images uploaded'}), 400
+    if len(files) > app.config['BATCH_MAX_IMAGES']:
+        return jsonify({'error': f"At most {app.config['BATCH_MAX_IMAGES']} images per batch"}), 400
+    
+    invalid = [file.filename for file in files if not file.filename or not allowed_file(file.filename)]
+    if invalid:
+        return jsonify({'error': 'Invalid file type', 'files': invalid}), 400
+    
+    uploads = [take_upload(file) for file in files]
+    invalid = [file.filename for file, upload in zip(files, uploads) if upload is None]
+    if invalid:
+        for upload in uploads:
+            if upload:
+                upload.release()
+        metrics.inc('upload_rejections_total', len(invalid),
+                    help='Uploads whose content is not a supported image')
+        return jsonify({'error': 'Invalid file type', 'files': invalid}), 400
+    
+    started = time.perf_counter()
+    scanned = scan_batch(uploads, session.get('user_id'))
+    metrics.observe('batch_scan_seconds', time.perf_counter() - started,
+                    help='Time to scan a whole /upload/batch request')
+    
+    results = []
+    for file, item in zip(files, scanned):
+        if item:
+            results.append({
+                'filename': file.filename,
+                'success': True,
+                'result_id': item['result_id'],
+                'result_url': url_for('result_by_id', result_id=item['result_id']),
+                'medicine': item['medicine']
+            })
+        else:
+            results.append({'filename': file.filename, 'success': False, 'error': 'Scan failed'})
+    
+    return jsonify({
+        'success': True,
+        'count': len(results),
+        'results': results
+    })
+
+def scan_job_payload(job_id, job):
+    payload = {'job_id': job_id, 'status': job['status']}
+    if job['status'] == 'done':
+        payload['result_id'] = job['result']['result_id']
+        payload['redirect'] = url_for('result_by_id', result_id=payload['result_id'])
+    elif job['status'] == 'failed':
+        payload['error'] = job['error'] or 'Scan failed'
+    return payload
+
+@app.route('/scan/<job_id>')
+def scan_status(job_id):
+    job = scan_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown scan job'}), 404
+    return jsonify(scan_job_payload(job_id, job))
+
+@app.route('/scan/<job_id>/events')
+def scan_events(job_id):
+    """Server-sent events: one 'status' event per change until the job finishes"""
+    if not app.config['SCAN_EVENTS']:
+        return jsonify({'error': 'Scan events are disabled; poll the status URL'}), 404
+    if not scan_queue.get(job_id):
+        return jsonify({'error': 'Unknown scan job'}), 404
+    
+    def generate():
+        last_status = None
+        while True:
+            job = scan_queue.get(job_id)
+            if not job:
+                return
+            if job['status'] != last_status:
+                last_status = job['status']
+                payload = scan_job_payload(job_id, job)
+                yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+            if job['status'] in FINISHED:
+                return
+            time.sleep(app.config['SCAN_POLL_INTERVAL'])
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/scan/<job_id>/result')
+def scan_result(job_id):
+    job = scan_queue.get(job_id)
+    if job and job['status'] == 'done':
+        session['last_result'] = job['result']['result_id']
+        return redirect(url_for('result_by_id', result_id=job['result']['result_id']))
+    return redirect(url_for('result'))
+
+@app.route('/result/<result_id>')
+def result_by_id(result_id):
+    medicine_info = result_store.get(result_id)
+    if not medicine_info:
+        abort(404)
+    if session.get('last_result') != result_id:
+        session['last_result'] = result_id
+    
+    # The result behind an id never changes, so browsers can revalidate by ETag
+    response = app.make_response(render_template('result.html', medicine=medicine_info))
+    response.set_etag(result_id)
+    response.cache_control.private = True
+    response.cache_control.max_age = app.config['RESULT_CACHE_MAX_AGE']
+    return response.make_conditional(request)
 
 @app.route('/result')
 def result():
-    medicine_info = session.get('last_medicine')
-    if not medicine_info:
-        # Provide COMPLETE demo data with ALL fields
-        medicine_info = {
-            'medicine_name': 'Paracetamol',
-            'brand': 'Crocin, Tylenol, Calpol',
-            'category': 'Analgesic/Antipyretic',
-            'uses': 'Pain relief and fever reduction. Used for headaches, muscle aches.',
-            'dosage': 'Adults: 500-1000mg every 4-6 hours. Maximum 4000mg per day.',
-            'precautions': 'Do not exceed recommended dose. Avoid if allergic. Consult doctor.',
-            'side_effects': 'Rare: skin rash. Overdose may cause liver damage.',
-            'food_restriction': 'Can be taken with or without food. Avoid alcohol.',
-            'image_url': '/static/images/medicine-placeholder.jpg',
-            'detection_method': 'Demo Mode',
-            'tamil_data': {
-                'name': 'பாராசிட்டமால்',
-                'uses': 'வலி நிவாரணம் மற்றும் காய்ச்சல் குறைப்பு.',
-                'dosage': 'பெரியவர்கள்: 500-1000 மி.கி ஒவ்வொரு 4-6 மணி நேரத்திற்கு.',
-                'precautions': 'வைத்தியரைக் கலந்தாலோசிக்கவும்.'
-            }
+    result_id = session.get('last_result')
+    if result_id and result_store.get(result_id):
+        return redirect(url_for('result_by_id', result_id=result_id))
+    
+    # Cookies from before results moved server-side
+    if 'last_medicine' in session:
+        session.pop('last_medicine')
+    
+    # Provide COMPLETE demo data with ALL fields
+    medicine_info = {
+        'medicine_name': 'Paracetamol',
+        'brand': 'Crocin, Tylenol, Calpol',
+        'category': 'Analgesic/Antipyretic',
+        'uses': 'Pain relief and fever reduction. Used for headaches, muscle aches.',
+        'dosage': 'Adults: 500-1000mg every 4-6 hours. Maximum 4000mg per day.',
+        'precautions': 'Do not exceed recommended dose. Avoid if allergic. Consult doctor.',
+        'side_effects': 'Rare: skin rash. Overdose may cause liver damage.',
+        'food_restriction': 'Can be taken with or without food. Avoid alcohol.',
+        'image_url': '/static/images/medicine-placeholder.jpg',
+        'detection_method': 'Demo Mode',
+        'tamil_data': {
+            'name': 'பாராசிட்டமால்',
+            'uses': 'வலி நிவாரணம் மற்றும் காய்ச்சல் குறைப்பு.',
+            'dosage': 'பெரியவர்கள்: 500-1000 மி.கி ஒவ்வொரு 4-6 மணி நேரத்திற்கு.',
+            'precautions': 'வைத்தியரைக் கலந்தாலோசிக்கவும்.'
         }
+    }
     
     return render_template('result.html', medicine=medicine_info)
 
+@app.route('/admin/cache', methods=['GET'])
+@admin_required
+def cache_stats():
+    return jsonify(info_cache.snapshot())
+
+@app.route('/admin/cache/invalidate', methods=['POST'])
+@admin_required
+def invalidate_cache():
+    data = request.get_json(silent=True) or {}
+    medicine_name = (data.get('medicine_name') or '').strip() or None
+    removed = info_cache.invalidate(medicine_name)
+    # Images keep their names but lose the stored info, so repeat and
+    # look-alike scans look it up again
+    conn = get_db()
+    images = upload_store.forget_info(conn, medicine_name)
+    conn.commit()
+    return jsonify({'success': True, 'removed': removed, 'images_cleared': images})
+
+def build_search_prompt(query, matches):
+    """Search prompt, with any relevant retrieved documents as context"""
+    prompt = f"As a medical assistant, provide short answer: {query}"
+    context = [document for score, document in matches
+               if score >= app.config['SEARCH_CONTEXT_THRESHOLD']]
+    if context:
+        prompt += "\n\nReference information:\n" + '\n'.join(context)
+    return prompt
+
+def answer_search_locally(query):
+    """Return (local answer or None, retrieved matches) for a search query
+    
+    A local answer is given when the top document scores at least
+    SEARCH_LOCAL_THRESHOLD and the query is a plain lookup of its medicine
+    or brand; anything more specific goes to Gemini with the matches as
+    context.
+    """
+    matches = retriever.search(query, k=app.config['SEARCH_TOP_K'])
+    if matches:
+        score, document = matches[0]
+        if score >= app.config['SEARCH_LOCAL_THRESHOLD'] and is_plain_lookup(query, document):
+            return format_document(document), matches
+    return None, matches
+
 @app.route('/search', methods=['POST'])
 def search():
+    started = time.perf_counter()
     try:
         data = request.get_json()
         query = data.get('query', '').strip()
@@ -481,34 +1316,226 @@ def search():
         if not query:
             return jsonify({'error': 'Empty query'}), 400
         
-        prompt = f"As a medical assistant, provide short answer: {query}"
-        response = model.generate_content(prompt)
+        answer, matches = answer_search_locally(query)
+        if answer:
+            source = 'local'
+        else:
+            prompt = build_search_prompt(query, matches)
+            try:
+                # Identical queries in flight share one generation
+                answer = search_flight.do(normalize_name(query), lambda: model.generate_content(prompt).text)
+                source = 'ai'
+            except Exception as e:
+                if not matches:
+                    raise
+                app.logger.warning('Search answered from the catalog, model call failed: %s', e)
+                count_fallback('search_local')
+                answer, source = format_document(matches[0][1]), 'local'
         
+        metrics.observe('search_seconds', time.perf_counter() - started,
+                        help='Time to a complete /search answer', route='search', source=source)
         return jsonify({
             'success': True,
-            'answer': response.text
+            'answer': answer,
+            'source': source
         })
         
     except Exception as e:
-        print(f"Search error: {e}")
+        app.logger.exception('Search failed: %s', e)
         return jsonify({
             'success': False,
             'error': 'Search failed'
         }), 500
 
+@app.route('/search/stream', methods=['POST'])
+def search_stream():
+    """Streaming /search: 'chunk' events as text arrives, then 'done' or 'error'"""
+    started = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    query = (data.get('query') or '').strip()
+    
+    if not query:
+        return jsonify({'error': 'Empty query'}), 400
+    
+    answer, matches = answer_search_locally(query)
+    source = 'local' if answer else 'ai'
+    response = failure = None
+    if not answer:
+        try:
+            response = model.generate_content(build_search_prompt(query, matches), stream=True)
+        except Exception as e:
+            failure = e
+        if failure and matches:
+            app.logger.warning('Search answered from the catalog, model call failed: %s', failure)
+            count_fallback('search_local')
+            answer, source = format_document(matches[0][1]), 'local'
+            failure = None
+    
+    def event(name, payload):
+        return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+    
+    def generate():
+        first_chunk = True
+        try:
+            if failure:
+                raise failure
+            if answer:
+                chunks = [answer]
+            else:
+                chunks = (chunk.text for chunk in response)
+            
+            for text in chunks:
+                if not text:
+                    continue
+                if first_chunk:
+                    first_chunk = False
+                    metrics.observe('search_ttfb_seconds', time.perf_counter() - started,
+                                    help='Time to the first streamed /search chunk', source=source)
+                yield event('chunk', {'text': text})
+            
+            yield event('done', {'source': source})
+        except Exception as e:
+            app.logger.exception('Search stream failed: %s', e)
+            yield event('error', {'error': 'Search failed'})
+        finally:
+            metrics.observe('search_seconds', time.perf_counter() - started,
+                            help='Time to a complete /search answer', route='search_stream', source=source)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/assets/<path:filename>')
+def assets(filename):
+    return send_asset(app.config['ASSET_DIST_FOLDER'], filename)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 def init_database():
     os.makedirs('static/uploads', exist_ok=True)
     os.makedirs('static/images', exist_ok=True)
     
-    try:
-        from auth import init_auth_db
-        init_auth_db()
-    except:
-        pass
-    
-    init_scan_db()
+    migrations.migrate(get_db())
     print("✅ Database initialized")
 
+@app.cli.command('migrate')
+def migrate_command():
+    """Create or upgrade the database schema"""
+    conn = get_db()
+    before = migrations.current_version(conn)
+    applied = migrations.migrate(conn)
+    for version, description in applied:
+        print(f"  {version}: {description}")
+    print(f"✅ Schema at version {migrations.current_version(conn)} "
+          f"({len(applied)} applied, was {before})")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress static assets into ASSET_DIST_FOLDER"""
+    stats = build_assets(app.static_folder, app.config['ASSET_DIST_FOLDER'])
+    for entry in stats:
+        sizes = ', '.join(f"{encoding} {entry[encoding]}" for encoding in ('gzip', 'br') if encoding in entry)
+        print(f"  {entry['name']} -> {entry['hashed']} ({entry['size']} bytes{', ' + sizes if sizes else ''})")
+    print(f"✅ {len(stats)} assets built in {app.config['ASSET_DIST_FOLDER']}")
+
+@app.cli.command('compact-uploads')
+def compact_uploads_command():
+    """Fold duplicate legacy uploads into the content-addressed layout"""
+    conn = get_db()
+    migrations.migrate(conn)
+    stats = upload_store.compact_uploads(conn, app.config['UPLOAD_FOLDER'])
+    
+    # Thumbnails for the history page
+    for name in os.listdir(app.config['UPLOAD_FOLDER']):
+        digest, ext = os.path.splitext(name)
+        if not upload_store.HASHED_NAME.match(name) or digest.endswith('_thumb'):
+            continue
+        thumb_path = os.path.join(app.config['UPLOAD_FOLDER'], upload_store.thumbnail_filename(digest))
+        if not os.path.exists(thumb_path):
+            make_thumbnail(os.path.join(app.config['UPLOAD_FOLDER'], name), thumb_path,
+                           thumb_edge=app.config['THUMBNAIL_EDGE'])
+    print(f"✅ Compacted uploads: {stats['scanned']} scanned, {stats['moved']} kept, "
+          f"{stats['removed']} duplicates removed ({stats['bytes_freed'] // 1024} KB freed)")
+
+@app.cli.command('translate-catalog')
+@click.option('--limit', type=int, default=None, help='Only the first N catalog medicines')
+@click.option('--delay', type=float, default=0.0, help='Seconds to wait after each model call')
+def translate_catalog_command(limit, delay):
+    """Precompute Tamil translations for every catalog medicine"""
+    migrations.migrate(get_db())
+    stats = {'translated': 0, 'cached': 0, 'failed': 0}
+    
+    for entry in medicine_catalog.entries[:limit]:
+        medicine_name, medicine_info = lookup_medicine_info(entry['medicine_name'])
+        if medicine_info.get('fallback'):
+            stats['failed'] += 1
+            continue
+        fields = tamil_source_fields(medicine_info)
+        _, missing = translator.lookup(medicine_name, fields)
+        if not missing:
+            stats['cached'] += 1
+            continue
+        
+        translated = translator.translate(medicine_name, fields)
+        stats['translated' if len(translated) == len(fields) else 'failed'] += 1
+        time.sleep(delay)
+    
+    print(f"✅ Tamil translations: {stats['translated']} translated, {stats['cached']} already cached, "
+          f"{stats['failed']} failed")
+
+@app.cli.command('build-info-store')
+@click.option('--rebuild', is_flag=True, help='Ignore any checkpoint and start over')
+@click.option('--rate', type=float, default=30.0, help='Model calls per minute (0 = no limit)')
+@click.option('--retries', type=int, default=2, help='Retries per medicine after a failed call')
+@click.option('--limit', type=int, default=None, help='Only the first N catalog medicines')
+def build_info_store_command(rebuild, rate, retries, limit):
+    """Pre-generate info for every catalog medicine into INFO_STORE_PATH"""
+    builder = InfoStoreBuilder(app.config['INFO_STORE_PATH'], info_prompt_version(), rebuild=rebuild)
+    done = builder.done()
+    
+    # Medicines the catalog cannot fully answer on its own
+    pending = [entry for entry in medicine_catalog.entries
+               if len(known_fields(entry)) < len(INFO_FIELDS)]
+    stats = {'generated': 0, 'resumed': 0, 'failed': 0}
+    interval = 60.0 / rate if rate > 0 else 0.0
+    next_call = 0.0
+    
+    for entry in pending[:limit]:
+        medicine_name = entry['medicine_name']
+        if normalize_name(medicine_name) in done:
+            stats['resumed'] += 1
+            continue
+        
+        known = known_fields(entry)
+        info = None
+        for attempt in range(retries + 1):
+            time.sleep(max(0.0, next_call - time.monotonic()))
+            next_call = time.monotonic() + interval
+            try:
+                info = generate_medicine_info(medicine_name, known)
+                break
+            except Exception as e:
+                app.logger.warning('Info for %s failed (attempt %d): %s', medicine_name, attempt + 1, e)
+                if attempt < retries:
+                    time.sleep(2 ** attempt)
+        
+        if info is None:
+            stats['failed'] += 1
+            continue
+        builder.add(medicine_name, info)
+        stats['generated'] += 1
+    
+    summary = (f"{stats['generated']} generated, {stats['resumed']} from checkpoint, "
+               f"{stats['failed']} failed")
+    if len(builder.done()) < len(pending):
+        builder.close()
+        print(f"⏸️  Info store checkpoint saved ({summary}); run again to resume")
+        return
+    
+    count = builder.finish()
+    print(f"✅ Info store built: {count} medicines in {app.config['INFO_STORE_PATH']} ({summary})")
+
 if __name__ == '__main__':
     init_database()
     print("🚀 Starting DoseRight...")
@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # gzip variants only
+    brotli = None
+
+# Fingerprinted static assets, built by `flask --app app2 build-assets`.
+#
+# Every file under ASSET_DIRS is copied into the dist folder with a hash of
+# its content in the name (css/style.css -> css/style.3f2a1b9c0d.css),
+# next to precompressed .gz and .br variants, and listed in manifest.json.
+# Templates link assets through asset_url(), and /assets/ serves the best
+# variant the browser accepts as immutable for a year. A changed file gets
+# a new name, so a cached copy never has to be revalidated. Older builds
+# are left in place for pages that still reference them.
+#
+# Without a built manifest asset_url() falls back to the plain static URL.
+
+ASSET_DIRS = ('css', 'js', 'images')
+COMPRESSIBLE = {'.css', '.js', '.svg', '.ico', '.json', '.txt', '.map'}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# base.<10 hex digits>.ext, as made by fingerprinted_name()
+FINGERPRINTED = re.compile(r'\.[0-9a-f]{10}(\.[^./]+)?$')
+
+
+def fingerprinted_name(path, data):
+    base, ext = os.path.splitext(path)
+    return f"{base}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build_assets(static_folder, dist_folder):
+    """Fingerprint and precompress the assets; returns one stats dict per file"""
+    manifest, stats = {}, []
+    for asset_dir in ASSET_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(static_folder, asset_dir)):
+            for filename in sorted(filenames):
+                source = os.path.join(dirpath, filename)
+                name = os.path.relpath(source, static_folder).replace(os.sep, '/')
+                with open(source, 'rb') as f:
+                    data = f.read()
+
+                hashed = fingerprinted_name(name, data)
+                manifest[name] = hashed
+                _write(os.path.join(dist_folder, hashed), data)
+                entry = {'name': name, 'hashed': hashed, 'size': len(data)}
+
+                if data and os.path.splitext(name)[1] in COMPRESSIBLE:
+                    variants = {'gzip': gzip.compress(data, 9, mtime=0)}
+                    if brotli:
+                        variants['br'] = brotli.compress(data, quality=11)
+                    for encoding, suffix in ENCODINGS:
+                        # Only worth serving when it is actually smaller
+                        if encoding in variants and len(variants[encoding]) < len(data):
+                            _write(os.path.join(dist_folder, hashed + suffix), variants[encoding])
+                            entry[encoding] = len(variants[encoding])
+                stats.append(entry)
+
+    # Swap the manifest in last, so it never names a file not yet written
+    os.makedirs(dist_folder, exist_ok=True)
+    tmp_path = os.path.join(dist_folder, MANIFEST + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(dist_folder, MANIFEST))
+    return stats
+
+
+class AssetManifest:
+    """Hashed names by static path; empty when no build exists"""
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    @classmethod
+    def open(cls, dist_folder):
+        path = os.path.join(dist_folder, MANIFEST)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def url(self, filename):
+        """URL for a file under static/, fingerprinted when built"""
+        hashed = self.entries.get(filename)
+        if hashed:
+            return url_for('assets', filename=hashed)
+        return url_for('static', filename=filename)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def send_asset(dist_folder, filename):
+    """A built asset, precompressed if the client accepts it
+
+    Fingerprinted files are cached as immutable. Anything else in the dist
+    folder, such as manifest.json, keeps its name across builds and must
+    be revalidated.
+    """
+    fingerprinted = FINGERPRINTED.search(filename) is not None
+    max_age = IMMUTABLE_MAX_AGE if fingerprinted else 0
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in ENCODINGS:
+        path = safe_join(dist_folder, filename + suffix)
+        if request.accept_encodings[encoding] and path and os.path.isfile(path):
+            response = send_from_directory(dist_folder, filename + suffix, mimetype=mimetype,
+                                           max_age=max_age)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(dist_folder, filename, mimetype=mimetype, max_age=max_age)
+
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    if fingerprinted:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
@@ -1,41 +1,19 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
-import sqlite3
+from db import get_db
 from functools import wraps
+from collections import OrderedDict
+import logging
+import threading
+import time
+import metrics
 
 # Create Blueprint for authentication
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
+logger = logging.getLogger(__name__)
 
-# Database helper functions
-def get_db_connection():
-    conn = sqlite3.connect('doseright.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_auth_db():
-    """Initialize authentication database tables"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Create users table
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  username TEXT UNIQUE NOT NULL,
-                  email TEXT UNIQUE,
-                  password_hash TEXT NOT NULL,
-                  full_name TEXT,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    # Create default admin user
-    try:
-        admin_hash = generate_password_hash('admin123')
-        c.execute("INSERT OR IGNORE INTO users (username, email, password_hash, full_name) VALUES (?, ?, ?, ?)",
-                  ('admin', 'admin@doseright.com', admin_hash, 'Administrator'))
-    except:
-        pass
-    
-    conn.commit()
-    conn.close()
+# Database helper functions (shared connection layer, see db.py)
+get_db_connection = get_db
 
 # Decorator for login required
 def login_required(f):
@@ -46,22 +24,66 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Decorator for admin-only routes
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('auth.login', next=request.url))
+        if session.get('username') != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Per-process cache of current_user snapshots, keyed by user_id.
+# Entries expire after USER_CACHE_TTL so other worker processes pick up
+# changes; call invalidate_user() wherever user rows are written.
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 300
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+def invalidate_user(user_id):
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+def get_current_user(user_id):
+    """Template snapshot of a user, from the cache when possible"""
+    now = time.time()
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+        if entry and now - entry[1] < USER_CACHE_TTL:
+            _user_cache.move_to_end(user_id)
+            metrics.inc('user_queries_avoided_total',
+                        help='current_user lookups answered without a users query')
+            return entry[0]
+    
+    conn = get_db_connection()
+    user = conn.execute('SELECT id, username, email, full_name FROM users WHERE id = ?', 
+                       (user_id,)).fetchone()
+    metrics.inc('user_queries_total', help='current_user lookups that queried the users table')
+    
+    user_info = {}
+    if user:
+        user_info = {
+            'id': user['id'],
+            'username': user['username'],
+            'email': user['email'],
+            'full_name': user['full_name'],
+            'is_authenticated': True
+        }
+        with _user_cache_lock:
+            _user_cache[user_id] = (user_info, now)
+            _user_cache.move_to_end(user_id)
+            while len(_user_cache) > USER_CACHE_SIZE:
+                _user_cache.popitem(last=False)
+    return user_info
+
 # Context processor to make user info available in templates
 def auth_context_processor():
     user_info = {}
     if 'user_id' in session:
-        conn = get_db_connection()
-        user = conn.execute('SELECT id, username, email, full_name FROM users WHERE id = ?', 
-                           (session['user_id'],)).fetchone()
-        conn.close()
-        if user:
-            user_info = {
-                'id': user['id'],
-                'username': user['username'],
-                'email': user['email'],
-                'full_name': user['full_name'],
-                'is_authenticated': True
-            }
+        user_info = get_current_user(session['user_id'])
     return dict(current_user=user_info)
 
 # Routes
@@ -96,7 +118,6 @@ def signup():
             existing_user = conn.execute('SELECT id FROM users WHERE username = ? OR email = ?',
                                         (username, email)).fetchone()
             if existing_user:
-                conn.close()
                 return render_template('signup.html', errors=['Username or email already exists'])
             
             # Create new user
@@ -108,9 +129,9 @@ def signup():
             
             # Get the new user's ID
             user = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
-            conn.close()
             
             # Set session
+            invalidate_user(user['id'])
             session['user_id'] = user['id']
             session['username'] = username
             session['logged_in'] = True
@@ -118,7 +139,7 @@ def signup():
             return redirect(url_for('index'))
             
         except Exception as e:
-            print(f"Signup error: {e}")
+            logger.warning('Signup error: %s', e)
             return render_template('signup.html', errors=['An error occurred during signup'])
     
     return render_template('signup.html')
@@ -137,7 +158,6 @@ def login():
             conn = get_db_connection()
             user = conn.execute('SELECT id, username, password_hash FROM users WHERE username = ?',
                                (username,)).fetchone()
-            conn.close()
             
             if user and check_password_hash(user['password_hash'], password):
                 session['user_id'] = user['id']
@@ -155,7 +175,7 @@ def login():
                 return render_template('login.html', error='Invalid username or password')
                 
         except Exception as e:
-            print(f"Login error: {e}")
+            logger.warning('Login error: %s', e)
             return render_template('login.html', error='An error occurred during login')
     
     return render_template('login.html')
@@ -172,21 +192,15 @@ def profile():
     user = conn.execute('SELECT username, email, full_name, created_at FROM users WHERE id = ?',
                        (session['user_id'],)).fetchone()
     
-    # Get scan statistics
-    stats = conn.execute('''SELECT COUNT(*) as total_scans, 
-                           MAX(timestamp) as last_scan 
-                           FROM scan_history WHERE user_id = ?''',
+    # Get scan statistics (maintained on insert, see user_scan_stats)
+    stats = conn.execute('''SELECT total_scans, last_scan 
+                           FROM user_scan_stats WHERE user_id = ?''',
                         (session['user_id'],)).fetchone()
     
-    conn.close()
-    
     # Prepare stats for template
     stats_dict = {
         'total_scans': stats['total_scans'] if stats and stats['total_scans'] else 0,
         'last_scan': stats['last_scan'][:10] if stats and stats['last_scan'] else 'Never'
     }
     
-    return render_template('profile.html', user=user, stats=stats_dict)
-
-# Initialize database when module is imported
-init_auth_db()
\ No newline at end of file
+    return render_template('profile.html', user=user, stats=stats_dict)
\ No newline at end of file
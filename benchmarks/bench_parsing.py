@@ -0,0 +1,62 @@
+"""Micro-benchmarks for the medicine info parsing paths.
+
+Run from the repository root:
+
+    python benchmarks/bench_parsing.py [--number 2000]
+
+Uses the stub model with zero latency, so the numbers are the app's own
+prompt building, parsing and caching cost. get_medicine_info_simple runs
+against a throwaway in-memory cache.
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ['MODEL_BACKEND'] = 'stub'
+os.environ['STUB_LATENCY_MS'] = '0'
+os.environ['STUB_LATENCY_SIGMA'] = '0'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app2
+import db
+from medicine_cache import MedicineInfoCache, init_cache_db
+from model_backend import STUB_RESPONSES
+
+
+def bench(label, fn, number):
+    fn(0)
+    start = time.perf_counter()
+    for i in range(number):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:48} {elapsed / number * 1e6:9.1f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    conn = db.connect(':memory:')
+    init_cache_db(conn)
+    app2.info_cache = MedicineInfoCache(lambda: conn, ttl=3600, max_memory=256, max_rows=100000)
+
+    info_text = STUB_RESPONSES['info'].format(name='Paracetamol')
+    structured_text = app2.model.structured_reply('Paracetamol')
+
+    bench('parse_medicine_info_text',
+          lambda i: app2.parse_medicine_info_text('Paracetamol', info_text), args.number)
+    bench('parse_structured_scan',
+          lambda i: app2.parse_structured_scan(structured_text), args.number)
+    bench('get_medicine_info (stub, 0 ms)',
+          lambda i: app2.get_medicine_info(f'Medicine {i}'), args.number)
+    bench('get_medicine_info_simple, cache miss',
+          lambda i: app2.get_medicine_info_simple(f'Medicine {i} miss'), args.number)
+    bench('get_medicine_info_simple, cache hit',
+          lambda i: app2.get_medicine_info_simple('Paracetamol'), args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Measure the upload preprocessing stage against the old full-size path.
+
+Run from the repository root:
+
+    python benchmarks/bench_preprocess.py [--dir static/uploads] [--repeat 5]
+
+"old" is what upload_image used to do: full decode, RGB convert, save at
+quality 85, then the SDK re-encodes the full-size PIL image for Gemini.
+"new" is imaging.preprocess_image with the app's IMAGE_* settings.
+"""
+import argparse
+import hashlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from imaging import preprocess_image
+
+
+def old_path(img_bytes):
+    img = Image.open(io.BytesIO(img_bytes))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    stored = io.BytesIO()
+    img.save(stored, format='JPEG', quality=85)
+    sent = io.BytesIO()
+    img.save(sent, format='JPEG')  # google-generativeai's pil_to_blob
+    return len(stored.getvalue()), len(sent.getvalue())
+
+
+def new_path(img_bytes, max_edge, thumb_edge, quality):
+    jpeg_bytes, thumb_bytes = preprocess_image(img_bytes, max_edge, thumb_edge, quality)
+    return len(jpeg_bytes) + len(thumb_bytes), len(jpeg_bytes)
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', default='static/uploads')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-edge', type=int, default=1280)
+    parser.add_argument('--thumb-edge', type=int, default=240)
+    parser.add_argument('--quality', type=int, default=80)
+    args = parser.parse_args()
+
+    # One sample per distinct payload
+    payloads = {}
+    for name in sorted(os.listdir(args.dir)):
+        path = os.path.join(args.dir, name)
+        if os.path.isfile(path) and not name.endswith('_thumb.jpg'):
+            with open(path, 'rb') as f:
+                data = f.read()
+            payloads.setdefault(hashlib.sha256(data).hexdigest(), (name, data))
+
+    totals = {'old_ms': 0, 'new_ms': 0, 'old_disk': 0, 'new_disk': 0, 'old_sent': 0, 'new_sent': 0}
+    print(f"{'image':32} {'size':>11} {'old ms':>8} {'new ms':>8} "
+          f"{'old disk':>9} {'new disk':>9} {'old sent':>9} {'new sent':>9}")
+    for name, data in payloads.values():
+        with Image.open(io.BytesIO(data)) as img:
+            size = f"{img.width}x{img.height}"
+        old_ms, (old_disk, old_sent) = median_ms(lambda: old_path(data), args.repeat)
+        new_ms, (new_disk, new_sent) = median_ms(
+            lambda: new_path(data, args.max_edge, args.thumb_edge, args.quality), args.repeat)
+        for key, value in (('old_ms', old_ms), ('new_ms', new_ms), ('old_disk', old_disk),
+                           ('new_disk', new_disk), ('old_sent', old_sent), ('new_sent', new_sent)):
+            totals[key] += value
+        print(f"{name[:32]:32} {size:>11} {old_ms:8.1f} {new_ms:8.1f} "
+              f"{old_disk // 1024:8}K {new_disk // 1024:8}K {old_sent // 1024:8}K {new_sent // 1024:8}K")
+
+    def pct(old, new):
+        return f"{(1 - new / old) * 100:.0f}% less" if old else 'n/a'
+
+    print(f"\n{len(payloads)} distinct images")
+    print(f"CPU time:        {totals['old_ms']:.0f} ms -> {totals['new_ms']:.0f} ms "
+          f"({pct(totals['old_ms'], totals['new_ms'])})")
+    print(f"Disk per scan:   {totals['old_disk'] // 1024} KB -> {totals['new_disk'] // 1024} KB "
+          f"({pct(totals['old_disk'], totals['new_disk'])}, new includes thumbnails)")
+    print(f"Sent to model:   {totals['old_sent'] // 1024} KB -> {totals['new_sent'] // 1024} KB "
+          f"({pct(totals['old_sent'], totals['new_sent'])})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compare /search answered from local retrieval with the Gemini-only path.
+
+Run from the repository root:
+
+    python benchmarks/bench_search.py [--repeat 20] [--skip-llm]
+
+The LLM-only path needs GEMINI_API_KEY and spends one generation per query
+per repeat, so keep --repeat small for it.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app2
+
+QUERIES = [
+    "What is paracetamol used for?",
+    "Dosage for metformin",
+    "What is the use of cetirizine?",
+    "Is ibuprofen safe on an empty stomach?",
+    "Compare paracetamol and ibuprofen",
+    "Side effects of antibiotics",
+]
+
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--llm-repeat', type=int, default=1)
+    parser.add_argument('--skip-llm', action='store_true')
+    args = parser.parse_args()
+
+    run_llm = not args.skip_llm and os.environ.get('GEMINI_API_KEY')
+    client = app2.app.test_client()
+
+    print(f"Retrieval backend: {app2.retriever.backend}")
+    print(f"{'query':40} {'route':>6} {'hybrid p50':>11} {'llm-only p50':>13}")
+    for query in QUERIES:
+        local, _ = app2.answer_search_locally(query)
+        source = 'local' if local else 'ai'
+
+        if source == 'local':
+            hybrid, _ = time_call(lambda: client.post('/search', json={'query': query}), args.repeat)
+        elif run_llm:
+            hybrid, _ = time_call(lambda: client.post('/search', json={'query': query}), args.llm_repeat)
+        else:
+            hybrid = None
+
+        llm_only = None
+        if run_llm:
+            prompt = f"As a medical assistant, provide short answer: {query}"
+            llm_only, _ = time_call(lambda: app2.model.generate_content(prompt), args.llm_repeat)
+
+        fmt = lambda ms: f"{ms:9.2f}ms" if ms is not None else '        n/a'
+        print(f"{query[:40]:40} {source:>6} {fmt(hybrid):>11} {fmt(llm_only):>13}")
+
+    if not run_llm:
+        print("\nLLM paths skipped (set GEMINI_API_KEY to measure them).")
+
+
+if __name__ == '__main__':
+    main()
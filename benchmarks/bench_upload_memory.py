@@ -0,0 +1,132 @@
+"""Measure resident memory per in-flight scan for large uploads.
+
+Run from the repository root:
+
+    python benchmarks/bench_upload_memory.py [--scans 32] [--latency-ms 8000]
+
+Posts --scans distinct camera-sized JPEGs to /upload at once, in-process
+with the stub model and a scratch working directory. The stub's latency is
+fixed and long, so every scan sits in its vision call together. RSS is
+sampled throughout. "held" is the RSS while all scans wait on the model,
+"peak" the highest seen, both above the baseline of a warmed-up app and
+divided by the number of scans.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+
+
+def rss_bytes():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, rss_bytes())
+            time.sleep(self.interval)
+
+
+def camera_jpeg(rng, size, path):
+    """A noisy photo-like JPEG unlike the others (distinct content and dHash)"""
+    grid = Image.frombytes('RGB', (12, 9), rng.randbytes(12 * 9 * 3)).resize(size, Image.BICUBIC)
+    noise = Image.effect_noise(size, 40).convert('RGB')
+    Image.blend(grid, noise, 0.25).save(path, 'JPEG', quality=92)
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scans', type=int, default=32)
+    parser.add_argument('--latency-ms', type=float, default=8000)
+    parser.add_argument('--width', type=int, default=3000)
+    parser.add_argument('--height', type=int, default=2250)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.update(MODEL_BACKEND='stub', STUB_LATENCY_MS=str(args.latency_ms), STUB_LATENCY_SIGMA='0',
+                      MODEL_HEDGE_QUANTILE='0',
+                      SCAN_WORKERS=str(args.scans), SCAN_QUEUE_DEPTH=str(args.scans * 2))
+    workdir = tempfile.mkdtemp(prefix='doseright-mem-')
+    os.symlink(os.path.join(ROOT, 'data'), os.path.join(workdir, 'data'))
+    os.chdir(workdir)
+
+    import app2
+    app2.init_database()
+    client = app2.app.test_client()
+
+    rng = random.Random(args.seed)
+    paths = [os.path.join(workdir, f'upload{i}.jpg') for i in range(args.scans + 1)]
+    sizes = [camera_jpeg(rng, (args.width, args.height), path) for path in paths]
+
+    def upload(path, results):
+        with open(path, 'rb') as f:
+            response = app2.app.test_client().post('/upload', data={'image': (f, 'photo.jpg')})
+        results.append(response.get_json())
+
+    def wait_done(jobs):
+        for job in jobs:
+            while client.get(job['status_url']).get_json()['status'] not in ('done', 'failed'):
+                time.sleep(0.05)
+
+    # Warm up imports, PIL codecs and caches with one scan
+    warm = []
+    upload(paths[-1], warm)
+    wait_done(warm)
+    time.sleep(0.2)
+    baseline = rss_bytes()
+
+    sampler = RssSampler()
+    sampler.start()
+    calls_before = app2.model.calls
+    results = []
+    threads = [threading.Thread(target=upload, args=(path, results)) for path in paths[:-1]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every scan is in its vision call once the stub has seen them all
+    while app2.model.calls - calls_before < args.scans:
+        time.sleep(0.01)
+    held = statistics.median(rss_bytes() for _ in range(20))
+    wait_done(results)
+    sampler.running = False
+    sampler.join()
+
+    mb = 1024 * 1024
+    print(f"{args.scans} scans of {args.width}x{args.height} JPEGs, "
+          f"{statistics.mean(sizes) / mb:.1f} MB average upload")
+    print(f"baseline RSS            {baseline / mb:8.1f} MB")
+    print(f"held while waiting      {(held - baseline) / mb:8.1f} MB  "
+          f"({(held - baseline) / args.scans / 1024:.0f} KB per scan)")
+    print(f"peak                    {(sampler.peak - baseline) / mb:8.1f} MB  "
+          f"({(sampler.peak - baseline) / args.scans / 1024:.0f} KB per scan)")
+
+    os.chdir(ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+"""Load-test /upload, /search, /history and /auth/login at a fixed concurrency.
+
+Run from the repository root:
+
+    python benchmarks/load_test.py [--concurrency 8] [--requests 50]
+                                   [--routes upload,search,history,login]
+                                   [--latency-ms 800] [--failure-rate 0.0]
+                                   [--url http://127.0.0.1:5000 | --gunicorn gthread]
+                                   [--synthetic-images]
+
+Without --url the app is loaded in-process with MODEL_BACKEND=stub, in a
+scratch directory with its own database and uploads folder, so no API quota
+is spent and the real doseright.db is untouched. With --url the requests go
+over HTTP to a running server (start it with MODEL_BACKEND=stub to keep it
+offline). --gunicorn starts one with that profile from gunicorn.conf.py,
+the stub model and a scratch directory, and stops it afterwards.
+
+Uploads use the sample images in static/uploads, or with --synthetic-images
+a fresh random image per request, so that no scan is answered from the
+exact or near-duplicate image store and every one waits on the model. An
+asynchronous /upload is followed to completion and reported twice: 'upload'
+is the request itself, 'scan' is submit-to-done as seen by the polling
+client. 'in flight' is the most scans submitted but not yet done.
+
+To compare worker models on one process, e.g.:
+
+    GUNICORN_WORKERS=1 python benchmarks/load_test.py --gunicorn gevent \
+        --routes upload,search --concurrency 300 --requests 600 --synthetic-images
+"""
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import queue
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USERNAME = 'loadtest'
+PASSWORD = 'loadtest-password'
+
+QUERIES = [
+    "What is paracetamol used for?",
+    "Dosage for metformin",
+    "Side effects of ibuprofen",
+    "Can I take cetirizine at night?",
+    "Compare paracetamol and ibuprofen",
+]
+
+
+class TestClient:
+    """In-process client: one Flask test client (and cookie jar) per worker"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.data
+
+    def post(self, path, form=None, files=None, json_body=None):
+        if json_body is not None:
+            response = self.client.post(path, json=json_body)
+        else:
+            data = dict(form or {})
+            for field, (filename, content) in (files or {}).items():
+                data[field] = (io.BytesIO(content), filename)
+            response = self.client.post(path, data=data)
+        return response.status_code, response.data
+
+
+class HttpClient:
+    """Client for a running server; clients made with one cookie jar share a session"""
+
+    def __init__(self, base_url, cookie_jar=None):
+        self.base_url = base_url.rstrip('/')
+        # An empty CookieJar is falsy, so `cookie_jar or ...` would not share it
+        if cookie_jar is None:
+            cookie_jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookie_jar),
+                                                  NoRedirect())
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=120) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, form=None, files=None, json_body=None):
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            content_type = 'application/json'
+        elif files:
+            boundary = uuid.uuid4().hex
+            parts = []
+            for name, value in (form or {}).items():
+                parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+            for name, (filename, content) in files.items():
+                parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                             f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode()
+                             + content + b'\r\n')
+            body = b''.join(parts) + f'--{boundary}--\r\n'.encode()
+            content_type = f'multipart/form-data; boundary={boundary}'
+        else:
+            body = urllib.parse.urlencode(form or {}).encode()
+            content_type = 'application/x-www-form-urlencoded'
+        request = urllib.request.Request(self.base_url + path, data=body, method='POST',
+                                         headers={'Content-Type': content_type})
+        return self._open(request)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Return 3xx responses as they are, instead of following them"""
+
+    # Time the route itself, not the page it redirects to
+    def http_error_302(self, req, fp, code, msg, headers):
+        return fp
+
+    http_error_301 = http_error_303 = http_error_307 = http_error_308 = http_error_302
+
+
+def stub_env(args):
+    return {'MODEL_BACKEND': 'stub', 'STUB_LATENCY_MS': str(args.latency_ms),
+            'STUB_FAILURE_RATE': str(args.failure_rate), 'STUB_SEED': str(args.seed)}
+
+
+def make_workdir():
+    workdir = tempfile.mkdtemp(prefix='doseright-load-')
+    os.symlink(os.path.join(ROOT, 'data'), os.path.join(workdir, 'data'))
+    return workdir
+
+
+def load_app(args):
+    """Import app2 with the stub model inside a scratch working directory"""
+    os.environ.update(stub_env(args))
+    workdir = make_workdir()
+    os.chdir(workdir)
+
+    import app2
+    app2.init_database()
+    return app2.app, workdir
+
+
+def start_gunicorn(args):
+    """gunicorn with the given profile and the stub model, in a scratch directory"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    workdir = make_workdir()
+    env = dict(os.environ, PYTHONPATH=ROOT, GUNICORN_PROFILE=args.gunicorn,
+               GUNICORN_BIND=f'127.0.0.1:{port}', **stub_env(args))
+    subprocess.run([sys.executable, '-c', 'import app2; app2.init_database()'],
+                   cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL)
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                                'app2:app'], cwd=workdir, env=env)
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"gunicorn exited with status {process.returncode}")
+        try:
+            urllib.request.urlopen(url + '/metrics', timeout=1).close()
+            return process, workdir, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit('gunicorn did not start within 60 s')
+
+
+def synthetic_image(rng):
+    """A small random JPEG, unlike any earlier upload"""
+    from PIL import Image
+    image = Image.frombytes('RGB', (8, 6), rng.randbytes(8 * 6 * 3)).resize((320, 240), Image.NEAREST)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return 'synthetic.jpg', buffer.getvalue()
+
+
+def load_images(folder, limit):
+    images = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path) and not name.endswith('_thumb.jpg'):
+            with open(path, 'rb') as f:
+                images.append((name, f.read()))
+        if len(images) >= limit:
+            break
+    if not images:
+        sys.exit(f"No sample images in {folder}")
+    return images
+
+
+def login(client):
+    return client.post('/auth/login', form={'username': USERNAME, 'password': PASSWORD})
+
+
+def ensure_user(client):
+    client.post('/auth/signup', form={'username': USERNAME, 'email': f'{USERNAME}@example.com',
+                                      'password': PASSWORD, 'confirm_password': PASSWORD,
+                                      'full_name': 'Load Test'})
+    status, _ = login(client)
+    # A failed login redirects too; check the session is really signed in
+    check, _ = client.get('/api/history?limit=1')
+    if status != 302 or check != 200:
+        sys.exit(f"Could not log in as {USERNAME} (login HTTP {status}, /api/history HTTP {check})")
+
+
+def do_upload(client, images, rng, record, in_flight, poll_interval=0.1):
+    name, content = synthetic_image(rng) if images is None else rng.choice(images)
+    ext = name.rsplit('.', 1)[-1] if '.' in name else 'jpg'
+    started = time.perf_counter()
+    status, body = client.post('/upload', files={'image': (f'sample.{ext}', content)})
+    record('upload', time.perf_counter() - started, status < 400)
+    if status != 202:
+        return
+
+    status_url = json.loads(body)['status_url']
+    in_flight(1)
+    try:
+        while True:
+            status, body = client.get(status_url)
+            job = json.loads(body) if status == 200 else {'status': 'failed'}
+            if job['status'] in ('done', 'failed'):
+                record('scan', time.perf_counter() - started, job['status'] == 'done')
+                return
+            time.sleep(poll_interval)
+    finally:
+        in_flight(-1)
+
+
+def do_search(client, rng, record):
+    started = time.perf_counter()
+    status, _ = client.post('/search', json_body={'query': rng.choice(QUERIES)})
+    record('search', time.perf_counter() - started, status == 200)
+
+
+def do_history(client, rng, record):
+    started = time.perf_counter()
+    status, _ = client.get('/history')
+    record('history', time.perf_counter() - started, status == 200)
+
+
+def do_login(client, rng, record):
+    started = time.perf_counter()
+    status, _ = login(client)
+    record('login', time.perf_counter() - started, status == 302)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not samples:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(samples))))
+    return samples[min(rank, len(samples)) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='base URL of a running server (default: in-process)')
+    parser.add_argument('--gunicorn', choices=['sync', 'gthread', 'gevent'],
+                        help='start gunicorn with this profile and test it over HTTP')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help='requests per route')
+    parser.add_argument('--routes', default='upload,search,history,login')
+    parser.add_argument('--images', default=os.path.join(ROOT, 'static', 'uploads'))
+    parser.add_argument('--max-images', type=int, default=20)
+    parser.add_argument('--synthetic-images', action='store_true',
+                        help='upload a new random image each time, so every scan calls the model')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='scan status polling interval')
+    parser.add_argument('--latency-ms', type=float, default=800, help='stub model median latency')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='stub model failure rate')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    images = None if args.synthetic_images else load_images(args.images, args.max_images)
+    workdir = server = None
+    if args.gunicorn:
+        server, workdir, args.url = start_gunicorn(args)
+    if args.url:
+        # One login for all workers; hundreds of password hashes at once
+        # would swamp the server before the test starts
+        cookie_jar = http.cookiejar.CookieJar()
+        make_client = lambda: HttpClient(args.url, cookie_jar)
+    else:
+        app, workdir = load_app(args)
+        make_client = lambda: TestClient(app)
+
+    ensure_user(make_client())
+
+    actions = {
+        'upload': lambda client, rng, record: do_upload(client, images, rng, record, in_flight,
+                                                        args.poll_interval),
+        'search': do_search,
+        'history': do_history,
+        'login': do_login,
+    }
+    routes = [route.strip() for route in args.routes.split(',') if route.strip()]
+    unknown = [route for route in routes if route not in actions]
+    if unknown:
+        sys.exit(f"Unknown routes: {', '.join(unknown)}")
+
+    # Interleave the routes so they run against each other
+    tasks = [route for route in routes for _ in range(args.requests)]
+    random.Random(args.seed).shuffle(tasks)
+    work = queue.Queue()
+    for task in tasks:
+        work.put(task)
+
+    samples = {}
+    errors = {}
+    scans = {'now': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def in_flight(change):
+        with lock:
+            scans['now'] += change
+            scans['peak'] = max(scans['peak'], scans['now'])
+
+    def record(route, seconds, ok):
+        with lock:
+            samples.setdefault(route, []).append(seconds)
+            if not ok:
+                errors[route] = errors.get(route, 0) + 1
+
+    def worker(index):
+        client = make_client()
+        if not args.url:
+            login(client)
+        rng = random.Random(args.seed + index)
+        while True:
+            try:
+                task = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                actions[task](client, rng, record)
+            except Exception as e:
+                record(task, 0.0, False)
+                print(f"{task} error: {e}")
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if server:
+        server.terminate()
+        server.wait()
+    model = f"stub model {args.latency_ms:.0f} ms median, {args.failure_rate:.0%} failures"
+    if args.gunicorn:
+        target = f"gunicorn {args.gunicorn} profile, {model}"
+    else:
+        target = args.url or f"in-process, {model}"
+    print(f"{len(tasks)} requests, concurrency {args.concurrency}, {elapsed:.1f} s ({target})\n")
+    print(f"{'route':10} {'count':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route in routes + (['scan'] if 'scan' in samples else []):
+        times = sorted(samples.get(route, []))
+        print(f"{route:10} {len(times):6} {errors.get(route, 0):6} {len(times) / elapsed:8.1f} "
+              f"{percentile(times, 50) * 1000:8.0f} {percentile(times, 95) * 1000:8.0f} "
+              f"{percentile(times, 99) * 1000:8.0f}")
+    print(f"\ntotal throughput: {len(tasks) / elapsed:.1f} req/s")
+    if 'scan' in samples:
+        print(f"peak scans in flight: {scans['peak']}")
+
+    if workdir:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import csv
+import logging
+import os
+import pickle
+import re
+
+from medicine_cache import normalize_name
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+# Column headers shared by medicines.csv and medicine_dataset_150.xlsx
+COLUMNS = {
+    'Medicine Name': 'medicine_name',
+    'Brand': 'brand',
+    'Category': 'category',
+    'Primary Use': 'uses',
+    'Food Restriction': 'food_restriction'
+}
+
+# "Label: value." sections in faiss_index_documents.pkl
+DOCUMENT_FIELDS = {
+    'Medicine': 'medicine_name',
+    'Brand': 'brand',
+    'Category': 'category',
+    'Uses': 'uses',
+    'Dosage': 'dosage',
+    'Precautions': 'precautions',
+    'Side Effects': 'side_effects',
+    'Food Restrictions': 'food_restriction'
+}
+
+INFO_FIELDS = ('uses', 'dosage', 'precautions', 'side_effects',
+               'food_restriction', 'category', 'brand')
+
+
+def _read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def _read_xlsx(path):
+    if openpyxl is None:
+        return []
+    wb = openpyxl.load_workbook(path, read_only=True)
+    rows = wb.active.iter_rows(values_only=True)
+    header = [str(h).strip() if h else '' for h in next(rows, [])]
+    records = [dict(zip(header, row)) for row in rows]
+    wb.close()
+    return records
+
+
+def _read_documents(path):
+    """Parse the embedded medicine documents into field dicts"""
+    with open(path, 'rb') as f:
+        documents = pickle.load(f)
+
+    labels = '|'.join(re.escape(label) for label in DOCUMENT_FIELDS)
+    pattern = re.compile(rf'({labels}):\s*(.*?)\.?\s*(?=(?:{labels}):|$)')
+    records = []
+    for doc in documents:
+        records.append({DOCUMENT_FIELDS[label]: value.strip()
+                        for label, value in pattern.findall(doc)})
+    return records
+
+
+class MedicineCatalog:
+    """In-memory index of the bundled medicine datasets.
+
+    Every entry is reachable by its normalized generic name and by its
+    normalized brand name, e.g. "azee" and "azithromycin" share one entry.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.index = {}
+
+    def add(self, record):
+        fields = {key: str(value).strip() for key, value in record.items()
+                  if value is not None and str(value).strip()}
+        name = fields.get('medicine_name')
+        if not name:
+            return
+
+        entry = self.index.get(normalize_name(name))
+        if entry is None:
+            entry = {}
+            self.entries.append(entry)
+        for key, value in fields.items():
+            entry.setdefault(key, value)
+
+        for key in (name, fields.get('brand'), entry.get('brand')):
+            if key:
+                self.index.setdefault(normalize_name(key), entry)
+
+    def lookup(self, medicine_name):
+        """Return the catalog entry for a generic or brand name, or None"""
+        return self.index.get(normalize_name(medicine_name))
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def known_fields(entry):
+    """The subset of the seven info fields a catalog entry can answer"""
+    return {key: entry[key] for key in INFO_FIELDS if entry.get(key)}
+
+
+def load_catalog(data_dir='data'):
+    """Build the catalog index from the files shipped in data/"""
+    catalog = MedicineCatalog()
+
+    # Full documents first so their richer fields win
+    sources = [
+        ('faiss_index_documents.pkl', _read_documents),
+        ('medicines.csv', _read_csv),
+        ('medicine_dataset_150.xlsx', _read_xlsx)
+    ]
+    for filename, reader in sources:
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path):
+            continue
+        try:
+            for row in reader(path):
+                if 'medicine_name' not in row:
+                    row = {COLUMNS[k]: v for k, v in row.items() if k in COLUMNS}
+                catalog.add(row)
+        except Exception as e:
+            logger.warning('Catalog load error for %s: %s', filename, e)
+
+    return catalog
@@ -0,0 +1,89 @@
+import functools
+import sqlite3
+import threading
+
+from flask import g, has_app_context
+
+# Shared data-access layer for app2.py and auth.py.
+#
+# Inside a request (or any app context) get_db() hands out one connection
+# per context, kept on flask.g and closed on teardown. Scan workers, CLI
+# commands and import-time setup get one long-lived connection per thread;
+# background jobs wrapped with job() end with no transaction left open.
+# Callers must not close the connection they are given.
+
+DATABASE = 'doseright.db'
+
+# Per connection; each is cheap
+PRAGMAS = [
+    ('synchronous', 'NORMAL'),      # fsync at checkpoints only; safe with WAL
+    ('busy_timeout', 5000),         # wait for a lock instead of "database is locked"
+    ('cache_size', -8000),          # 8 MB page cache
+    ('mmap_size', 64 * 1024 * 1024),
+    ('temp_store', 'MEMORY')
+]
+
+_local = threading.local()
+_wal_enabled = set()
+_wal_lock = threading.Lock()
+
+
+def connect(path=None):
+    """Open a new tuned connection"""
+    path = path or DATABASE
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    # WAL (readers never block the writer) is stored in the database file,
+    # so it only needs setting once per process
+    with _wal_lock:
+        if path not in _wal_enabled:
+            conn.execute('PRAGMA journal_mode = WAL')
+            _wal_enabled.add(path)
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def get_db():
+    """Connection for the current request, or for the current thread"""
+    if has_app_context():
+        if 'db' not in g:
+            g.db = connect()
+        return g.db
+
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = connect()
+    return conn
+
+
+def end_thread_transaction():
+    """Roll back whatever the thread's connection left uncommitted"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+def job(fn):
+    """Wrap fn for a worker thread, so a failed call can't leave its
+    connection holding the write lock
+    """
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            end_thread_transaction()
+    return run
+
+
+def close_db(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
+
+
+def init_app(app):
+    global DATABASE
+    DATABASE = app.config.get('DATABASE', DATABASE)
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+
+# gunicorn settings, read automatically when started from the repository
+# root:
+#
+#     GUNICORN_PROFILE=gthread gunicorn app2:app
+#
+# GUNICORN_PROFILE picks the worker model:
+#
+#   sync     one request at a time per process; many processes
+#   gthread  GUNICORN_THREADS request threads per process (the default)
+#   gevent   cooperative greenlets, GUNICORN_CONNECTIONS per process;
+#            needs gevent, and talks to Gemini over REST so the calls yield;
+#            the only profile that streams scan events to the browser
+#
+# Scans and searches spend nearly all their time waiting on the model, so
+# gthread and gevent keep hundreds of them in flight in one process. Each
+# profile sizes the scan queue and the model client's pool to match; any
+# of those settings already in the environment wins.
+
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+cpus = multiprocessing.cpu_count()
+
+PROFILES = {
+    'sync': {
+        'worker_class': 'sync',
+        'workers': 2 * cpus + 1,
+        'env': {'SCAN_WORKERS': '4', 'SCAN_QUEUE_DEPTH': '32', 'MODEL_MAX_CONCURRENCY': '32'},
+    },
+    'gthread': {
+        'worker_class': 'gthread',
+        'workers': 1,
+        'env': {'SCAN_WORKERS': '256', 'SCAN_QUEUE_DEPTH': '1024', 'MODEL_MAX_CONCURRENCY': '512',
+                'BATCH_PARALLELISM': '64'},
+    },
+    'gevent': {
+        'worker_class': 'gevent',
+        'workers': 1,
+        'env': {'SCAN_WORKERS': '512', 'SCAN_QUEUE_DEPTH': '2048', 'MODEL_MAX_CONCURRENCY': '1024',
+                'BATCH_PARALLELISM': '128', 'MODEL_TRANSPORT': 'rest', 'SCAN_EVENTS': '1'},
+    },
+}
+if profile not in PROFILES:
+    raise RuntimeError(f"GUNICORN_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+settings = PROFILES[profile]
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = settings['worker_class']
+workers = int(os.environ.get('GUNICORN_WORKERS', settings['workers']))
+threads = int(os.environ.get('GUNICORN_THREADS', 256))  # gthread only
+worker_connections = int(os.environ.get('GUNICORN_CONNECTIONS', 2000))  # gevent only
+
+# Scan workers and the model pool are threads started at import, and
+# threads do not survive a fork, so every worker loads the app itself
+preload_app = False
+
+# A model call is bounded by MODEL_DEADLINE; leave room for retries and the
+# translation that follows it
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Polling a scan job must reach the process that holds it, unless job
+# state is shared through SQLite
+if workers > 1:
+    os.environ.setdefault('SCAN_JOB_STORE', 'sqlite')
+for name, value in settings['env'].items():
+    os.environ.setdefault(name, value)
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')  # '-' for stdout
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    server.log.info('DoseRight serving with the %s profile: %d worker(s), scan workers %s, '
+                    'model pool %s', profile, workers, os.environ['SCAN_WORKERS'],
+                    os.environ['MODEL_MAX_CONCURRENCY'])
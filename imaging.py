@@ -0,0 +1,71 @@
+import io
+
+from PIL import Image, ImageOps
+
+
+def preprocess_image(image, max_edge=1280, thumb_edge=240, quality=80):
+    """Decode, orient and shrink an upload (bytes or a binary file) for label reading.
+
+    JPEGs are decoded in draft mode, which lets libjpeg scale by 1/2, 1/4 or
+    1/8 while decoding instead of materialising every full-size pixel. The
+    image is then rotated per its EXIF orientation, downsampled to at most
+    `max_edge` pixels on the long side and re-encoded without metadata.
+
+    Returns (jpeg_bytes, thumbnail_jpeg_bytes).
+    """
+    img = Image.open(io.BytesIO(image) if isinstance(image, bytes) else image)
+    if img.format == 'JPEG':
+        img.draft('RGB', (max_edge, max_edge))
+
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=3.0)
+
+    thumb = img.copy()
+    thumb.thumbnail((thumb_edge, thumb_edge), Image.LANCZOS, reducing_gap=2.0)
+
+    return encode_jpeg(img, quality), encode_jpeg(thumb, quality)
+
+
+def encode_jpeg(img, quality=80):
+    # No exif= argument, so nothing from the original metadata is written
+    out = io.BytesIO()
+    img.save(out, format='JPEG', quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def make_thumbnail(path, thumb_path, thumb_edge=240, quality=80):
+    """Write a thumbnail for an already stored image"""
+    with Image.open(path) as img:
+        img.draft('RGB', (thumb_edge, thumb_edge))
+        img = img.convert('RGB')
+        img.thumbnail((thumb_edge, thumb_edge), Image.LANCZOS, reducing_gap=2.0)
+        with open(thumb_path, 'wb') as f:
+            f.write(encode_jpeg(img, quality))
+
+
+def dhash(img_bytes, size=8):
+    """64-bit difference hash of an image, as 16 hex digits
+
+    The image is reduced to a (size+1) x size grayscale grid and each bit
+    records whether a pixel is brighter than its right-hand neighbour, so
+    small changes in framing, exposure or compression flip only a few bits.
+    """
+    with Image.open(io.BytesIO(img_bytes)) as img:
+        img.draft('L', (size * 8, size * 8))
+        grid = ImageOps.exif_transpose(img).convert('L').resize((size + 1, size), Image.BILINEAR)
+        pixels = list(grid.getdata())
+
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{size * size // 4}x}"
+
+
+def image_part(jpeg_bytes):
+    """Inline image part for model.generate_content, sent as-is"""
+    return {'mime_type': 'image/jpeg', 'data': jpeg_bytes}
@@ -0,0 +1,103 @@
+import json
+import os
+import sqlite3
+import time
+
+from medicine_cache import normalize_name
+
+# Read-only store of pre-generated medicine info for the catalog, built
+# offline by `flask --app app2 build-info-store`.
+#
+# It is a single small SQLite file. The build writes <path>.building and
+# commits after every medicine, so an interrupted build resumes from there.
+# When every medicine is done the file is vacuumed and renamed into place.
+# The app reads the whole store into memory at startup.
+
+
+def init_store_db(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS meta
+                    (key TEXT PRIMARY KEY,
+                     value TEXT NOT NULL)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS medicine_info
+                    (name_key TEXT PRIMARY KEY,
+                     medicine_name TEXT NOT NULL,
+                     info TEXT NOT NULL) WITHOUT ROWID''')
+
+
+class InfoStore:
+    """Pre-generated info by medicine name; empty when no store was built"""
+
+    def __init__(self, entries=None, meta=None):
+        self.entries = entries or {}
+        self.meta = meta or {}
+
+    @classmethod
+    def open(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            meta = dict(conn.execute('SELECT key, value FROM meta'))
+            entries = {key: json.loads(info) for key, info in
+                       conn.execute('SELECT name_key, info FROM medicine_info')}
+        finally:
+            conn.close()
+        return cls(entries, meta)
+
+    def get(self, medicine_name):
+        info = self.entries.get(normalize_name(medicine_name))
+        return dict(info) if info else None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class InfoStoreBuilder:
+    """Writes a store, resuming a checkpoint made with the same prompt version"""
+
+    def __init__(self, path, prompt_version, rebuild=False):
+        self.path = path
+        self.building_path = path + '.building'
+        self.prompt_version = prompt_version
+
+        if os.path.exists(self.building_path) and (rebuild or self._checkpoint_version() != prompt_version):
+            os.remove(self.building_path)
+
+        self.conn = sqlite3.connect(self.building_path)
+        init_store_db(self.conn)
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('prompt_version', ?)",
+                          (prompt_version,))
+        self.conn.commit()
+
+    def _checkpoint_version(self):
+        conn = sqlite3.connect(self.building_path)
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'prompt_version'").fetchone()
+            return row[0] if row else None
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+
+    def done(self):
+        """Name keys already in the checkpoint"""
+        return {row[0] for row in self.conn.execute('SELECT name_key FROM medicine_info')}
+
+    def add(self, medicine_name, info):
+        self.conn.execute('INSERT OR REPLACE INTO medicine_info (name_key, medicine_name, info) VALUES (?, ?, ?)',
+                          (normalize_name(medicine_name), medicine_name, json.dumps(info, ensure_ascii=False)))
+        self.conn.commit()
+
+    def finish(self):
+        """Seal the store and move it into place; returns the entry count"""
+        count = self.conn.execute('SELECT COUNT(*) FROM medicine_info').fetchone()[0]
+        self.conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                              [('built_at', str(int(time.time()))), ('count', str(count))])
+        self.conn.commit()
+        self.conn.execute('VACUUM')
+        self.conn.close()
+        os.replace(self.building_path, self.path)
+        return count
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,131 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_METRIC_HELP = 'Medicine info cache lookups by outcome'
+
+
+def normalize_name(medicine_name):
+    """Cache key for a medicine name: lowercase words, no punctuation"""
+    words = re.sub(r'[^a-z0-9+]+', ' ', (medicine_name or '').lower()).split()
+    return ' '.join(words)
+
+
+def init_cache_db(conn):
+    """Create the persistent medicine info cache table"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS medicine_info_cache
+                    (name_key TEXT PRIMARY KEY,
+                     medicine_info TEXT NOT NULL,
+                     created_at REAL NOT NULL)''')
+
+
+class MedicineInfoCache:
+    """Two-tier cache for parsed medicine info.
+
+    Tier one is an in-process LRU of at most `max_memory` entries, tier two
+    is the medicine_info_cache table, trimmed to `max_rows` oldest-first.
+    Entries older than `ttl` seconds are treated as misses in both tiers.
+    A memory entry is only trusted for `memory_ttl` seconds before the table
+    is read again, so invalidate() in one worker process reaches the others
+    within that time.
+    """
+
+    def __init__(self, connect, ttl=7 * 24 * 3600, max_memory=256, max_rows=5000, memory_ttl=60):
+        self.connect = connect
+        self.ttl = ttl
+        self.memory_ttl = memory_ttl
+        self.max_memory = max_memory
+        self.max_rows = max_rows
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, medicine_name):
+        key = normalize_name(medicine_name)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[1] < self.ttl and now - entry[2] < self.memory_ttl:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                metrics.inc('info_cache_lookups_total', help=CACHE_METRIC_HELP, result='memory_hit')
+                return dict(entry[0])
+            if entry:
+                del self._memory[key]
+
+        row = None
+        try:
+            conn = self.connect()
+            row = conn.execute('''SELECT medicine_info, created_at FROM medicine_info_cache
+                                  WHERE name_key = ? AND created_at > ?''',
+                               (key, now - self.ttl)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning('Info cache read error: %s', e)
+
+        if row:
+            info = json.loads(row['medicine_info'])
+            self._remember(key, info, row['created_at'])
+            with self._lock:
+                self.stats['db_hits'] += 1
+            metrics.inc('info_cache_lookups_total', help=CACHE_METRIC_HELP, result='db_hit')
+            return dict(info)
+
+        with self._lock:
+            self.stats['misses'] += 1
+        metrics.inc('info_cache_lookups_total', help=CACHE_METRIC_HELP, result='miss')
+        return None
+
+    def set(self, medicine_name, info):
+        key = normalize_name(medicine_name)
+        now = time.time()
+        self._remember(key, dict(info), now)
+
+        try:
+            conn = self.connect()
+            conn.execute('''INSERT OR REPLACE INTO medicine_info_cache (name_key, medicine_info, created_at)
+                            VALUES (?, ?, ?)''', (key, json.dumps(info), now))
+            conn.execute('''DELETE FROM medicine_info_cache WHERE created_at <= ?
+                            OR name_key IN (SELECT name_key FROM medicine_info_cache
+                                            ORDER BY created_at DESC LIMIT -1 OFFSET ?)''',
+                         (now - self.ttl, self.max_rows))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning('Info cache write error: %s', e)
+
+    def invalidate(self, medicine_name=None):
+        """Drop one medicine, or everything when no name is given"""
+        if medicine_name is None:
+            with self._lock:
+                self._memory.clear()
+            query, params = 'DELETE FROM medicine_info_cache', ()
+        else:
+            key = normalize_name(medicine_name)
+            with self._lock:
+                self._memory.pop(key, None)
+            query, params = 'DELETE FROM medicine_info_cache WHERE name_key = ?', (key,)
+
+        conn = self.connect()
+        removed = conn.execute(query, params).rowcount
+        conn.commit()
+        return removed
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, memory_entries=len(self._memory))
+
+    def _remember(self, key, info, created_at):
+        with self._lock:
+            self._memory[key] = (info, created_at, time.time())
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory:
+                self._memory.popitem(last=False)
+                self.stats['evictions'] += 1
@@ -0,0 +1,144 @@
+import os
+
+from werkzeug.security import generate_password_hash
+
+import upload_store
+from medicine_cache import init_cache_db
+from result_store import init_results_db
+from scan_jobs import init_jobs_db
+from translation import init_translations_db
+
+# Ordered schema steps, applied once each by `flask --app app2 migrate`.
+# The applied steps are recorded in schema_version, so app startup only has
+# to compare one number. Never change a released step; append a new one.
+#
+# Steps use IF NOT EXISTS so a database created by the old import-time
+# setup (tables present, no schema_version) upgrades cleanly.
+
+
+def create_users(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     username TEXT UNIQUE NOT NULL,
+                     email TEXT UNIQUE,
+                     password_hash TEXT NOT NULL,
+                     full_name TEXT,
+                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+
+def seed_admin(conn):
+    # Hash only when the account is missing - the KDF is deliberately slow
+    if conn.execute("SELECT 1 FROM users WHERE username = 'admin'").fetchone():
+        return
+    password = os.environ.get('ADMIN_PASSWORD', 'admin123')
+    conn.execute('''INSERT OR IGNORE INTO users (username, email, password_hash, full_name)
+                    VALUES (?, ?, ?, ?)''',
+                 ('admin', 'admin@doseright.com', generate_password_hash(password), 'Administrator'))
+
+
+def create_scan_history(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS scan_history
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     user_id INTEGER,
+                     medicine_name TEXT NOT NULL,
+                     image_url TEXT,
+                     category TEXT,
+                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    # Keyset pagination index for /history and /api/history
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_scan_history_user_time
+                    ON scan_history (user_id, timestamp DESC, id DESC)''')
+
+
+def create_user_scan_stats(conn):
+    # Per-user scan totals, kept current by a trigger on insert
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_scan_stats
+                    (user_id INTEGER PRIMARY KEY,
+                     total_scans INTEGER NOT NULL DEFAULT 0,
+                     last_scan TIMESTAMP)''')
+    conn.execute('''INSERT OR IGNORE INTO user_scan_stats (user_id, total_scans, last_scan)
+                    SELECT user_id, COUNT(*), MAX(timestamp) FROM scan_history
+                    WHERE user_id IS NOT NULL GROUP BY user_id''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS trg_scan_history_stats
+                    AFTER INSERT ON scan_history WHEN NEW.user_id IS NOT NULL
+                    BEGIN
+                        INSERT INTO user_scan_stats (user_id, total_scans, last_scan)
+                        VALUES (NEW.user_id, 1, NEW.timestamp)
+                        ON CONFLICT(user_id) DO UPDATE SET
+                            total_scans = total_scans + 1,
+                            last_scan = MAX(COALESCE(last_scan, ''), NEW.timestamp);
+                    END''')
+
+
+def create_scan_tables(conn):
+    upload_store.init_upload_store_db(conn)
+    init_cache_db(conn)
+    init_jobs_db(conn)
+    init_results_db(conn)
+    init_translations_db(conn)
+
+
+def add_missing_indexes(conn):
+    # SELECT DISTINCT medicine_name for the name index at startup
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_scan_history_medicine
+                    ON scan_history (medicine_name)''')
+    # TTL and size trimming scan these by age
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_medicine_info_cache_created
+                    ON medicine_info_cache (created_at)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_scan_jobs_created
+                    ON scan_jobs (created_at)''')
+
+
+MIGRATIONS = [
+    (1, 'users table', create_users),
+    (2, 'default admin account', seed_admin),
+    (3, 'scan_history table', create_scan_history),
+    (4, 'user_scan_stats table and trigger', create_user_scan_stats),
+    (5, 'image store, caches, jobs, results and translations', create_scan_tables),
+    (6, 'indexes for history names, cache and job expiry', add_missing_indexes),
+    (7, 'perceptual hash column on image_store', upload_store.add_phash_column),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def init_version_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY,
+                     description TEXT NOT NULL,
+                     applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+
+def current_version(conn):
+    """Highest applied migration, 0 for a new or pre-migration database"""
+    try:
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except Exception:
+        return 0
+    return row[0] or 0
+
+
+def migrate(conn):
+    """Apply pending steps in order, each in its own transaction
+
+    Returns the list of (version, description) applied.
+    """
+    init_version_table(conn)
+    conn.commit()
+
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version <= current_version(conn):
+            continue
+        # IMMEDIATE takes the write lock, so a concurrent migrate waits here
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version > current_version(conn):
+                step(conn)
+                conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                             (version, description))
+                applied.append((version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+from google.generativeai.types import content_types, generation_types
+
+# The app talks to its model through generate_content(contents, stream=False)
+# and reads .text from the reply (or from each chunk when streaming). Both
+# backends below provide exactly that: GeminiModel, and StubModel, an
+# offline stand-in for load tests and benchmarks that spends no API quota.
+# Both also take request_options={'timeout': seconds} (see model_client.py)
+# and are safe to share between threads and greenlets.
+
+STUB_NAMES = ['Paracetamol', 'Ibuprofen', 'Amoxicillin', 'Azithromycin',
+              'Cetirizine', 'Metformin', 'Omeprazole', 'Pantoprazole']
+
+# Canned replies by prompt kind; {name}, {query} and {text} are filled in
+STUB_RESPONSES = {
+    'name': "{name}",
+    'info': ("Uses: {name} is used to treat common conditions.\nAsk your doctor if it suits you.\n"
+             "Dosage: Take as prescribed.\nDo not exceed the stated dose.\n"
+             "Precautions: Tell your doctor about other medicines.\nAvoid if allergic.\n"
+             "Side Effects: Nausea or headache.\nStop and seek help if severe.\n"
+             "Food: Take after food.\nAvoid alcohol.\n"
+             "Type: Medicine\n"
+             "Brands: Generic {name}"),
+    'structured': None,  # built from 'info' unless given
+    'translate': "[ta] {text}",
+    'search': "Stub answer to '{query}'. Please consult a doctor or pharmacist for advice."
+}
+
+
+class GeminiModel:
+    """Gemini through one shared gapic client, with per-call timeouts.
+
+    This SDK version's GenerativeModel has no per-call timeout, so requests
+    are built here and sent to the client directly. The client is made on
+    the first call, under a lock so concurrent first calls share it, which
+    also lets the app import without credentials (CLI commands,
+    benchmarks). The gapic client is thread-safe. Its own retries are
+    turned off, because model_client retries with jitter.
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name if model_name.startswith('models/') else f'models/{model_name}'
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = genai_client.get_default_generative_client()
+        return self._client
+
+    def generate_content(self, contents, stream=False, request_options=None):
+        request = glm.GenerateContentRequest(model=self.model_name,
+                                             contents=content_types.to_contents(contents))
+        timeout = (request_options or {}).get('timeout')
+        if stream:
+            with generation_types.rewrite_stream_error():
+                iterator = self.client.stream_generate_content(request, retry=None, timeout=timeout)
+            return generation_types.GenerateContentResponse.from_iterator(iterator)
+        response = self.client.generate_content(request, retry=None, timeout=timeout)
+        return generation_types.GenerateContentResponse.from_response(response)
+
+
+class StubModelError(Exception):
+    """Injected failure from StubModel"""
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Deterministic offline stand-in for genai.GenerativeModel.
+
+    Latency is log-normal around `latency_ms` (sigma 0 makes it fixed) and
+    a `failure_rate` share of calls raise StubModelError. Draws come from a
+    seeded RNG, and the medicine "seen" in an image is picked from `names`
+    by a hash of the image bytes, so the same image always gives the same
+    answer. `responses` overrides entries of STUB_RESPONSES.
+    """
+
+    def __init__(self, latency_ms=800, latency_sigma=0.4, failure_rate=0.0, seed=0,
+                 names=None, responses=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.names = names or STUB_NAMES
+        self.responses = dict(STUB_RESPONSES, **(responses or {}))
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            if self.latency_sigma > 0:
+                delay = self._random.lognormvariate(0, self.latency_sigma) * self.latency_ms
+            else:
+                delay = self.latency_ms
+            failed = self._random.random() < self.failure_rate
+        return delay / 1000, failed
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        delay, failed = self._draw()
+        time.sleep(delay)
+        if failed:
+            raise StubModelError('Injected stub model failure')
+
+        text = self.reply(contents)
+        if stream:
+            words = text.split(' ')
+            return (StubResponse(' '.join(words[i:i + 4]) + ' ') for i in range(0, len(words), 4))
+        return StubResponse(text)
+
+    def reply(self, contents):
+        """Canned reply for a prompt, or for [image, prompt]"""
+        if isinstance(contents, list):
+            image, prompt = contents[0], contents[-1]
+            name = self.names[int(image_digest(image), 16) % len(self.names)]
+            if 'JSON' in prompt:
+                return self.structured_reply(name)
+            return self.responses['name'].format(name=name)
+
+        if contents.startswith('Translate'):
+            fields = json.loads(re.search(r'\{.*\}', contents, re.S).group(0))
+            return json.dumps({key: self.responses['translate'].format(text=value)
+                               for key, value in fields.items()}, ensure_ascii=False)
+
+        match = re.search(r"about '([^']+)'", contents)
+        if match:
+            return self.responses['info'].format(name=match.group(1))
+        query = contents.split('\n')[0].split(':', 1)[-1].strip()
+        return self.responses['search'].format(query=query)
+
+    def structured_reply(self, name):
+        if self.responses['structured']:
+            return self.responses['structured'].format(name=name)
+        sections = dict(re.findall(r'^([A-Za-z ]+): (.*(?:\n(?![A-Za-z ]+: ).*)*)',
+                                   self.responses['info'].format(name=name), re.M))
+        return json.dumps({
+            'medicine_name': name,
+            'uses': sections.get('Uses', ''),
+            'dosage': sections.get('Dosage', ''),
+            'precautions': sections.get('Precautions', ''),
+            'side_effects': sections.get('Side Effects', ''),
+            'food_restriction': sections.get('Food', ''),
+            'category': sections.get('Type', 'Medicine'),
+            'brand': sections.get('Brands', name)
+        })
+
+
+def image_digest(image):
+    """Stable hash of an image part dict or PIL image"""
+    data = image['data'] if isinstance(image, dict) else image.tobytes()
+    return hashlib.md5(data).hexdigest()
+
+
+def create_model(config):
+    """Model backend selected by config['MODEL_BACKEND']: 'gemini' or 'stub'"""
+    if config['MODEL_BACKEND'] == 'stub':
+        responses = None
+        if config.get('STUB_RESPONSES'):
+            with open(config['STUB_RESPONSES'], encoding='utf-8') as f:
+                responses = json.load(f)
+        return StubModel(latency_ms=config['STUB_LATENCY_MS'],
+                         latency_sigma=config['STUB_LATENCY_SIGMA'],
+                         failure_rate=config['STUB_FAILURE_RATE'],
+                         seed=config['STUB_SEED'],
+                         responses=responses)
+
+    # 'rest' goes through requests, which gevent can make cooperative
+    genai.configure(api_key=config['GEMINI_API_KEY'], transport=config.get('MODEL_TRANSPORT'))
+    return GeminiModel(config['MODEL_NAME'])
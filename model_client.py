@@ -0,0 +1,257 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Wraps a model backend (see model_backend.py) with the same
+# generate_content(contents, stream=False) interface, adding:
+#
+# - a deadline for the whole call, retries included
+# - a hedged second request once an attempt outlives the recent p95
+# - bounded retries with full jitter for transient upstream errors
+# - a circuit breaker that fails fast while the upstream is down, so
+#   callers go straight to their cache or catalog fallback
+#
+# Attempts run on a small pool, so a caller is released at its deadline
+# even if the upstream never answers. The timeout is also passed to the
+# backend as request_options so abandoned attempts end too.
+
+# HTTP statuses worth retrying; google.api_core errors carry one in .code
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+CALLS_HELP = 'Model calls by outcome; "rejected" ones were refused by the open circuit'
+
+
+class ModelUnavailable(Exception):
+    """The circuit is open; the upstream is not being called"""
+
+
+class ModelTimeout(Exception):
+    """No reply before the call's deadline"""
+
+
+def is_retryable(error):
+    if isinstance(error, (ModelTimeout, TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS
+    # Backends without status codes (e.g. StubModelError): assume transient
+    return not isinstance(error, (ValueError, TypeError))
+
+
+def contents_kind(contents):
+    return 'image' if isinstance(contents, list) else 'text'
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` failures in a row.
+
+    While open every call is refused. After `reset_timeout` seconds one
+    probe call is let through (half-open); its outcome closes or reopens
+    the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED
+                                                and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def _transition(self, state):
+        logger.warning('Model circuit %s -> %s', self.state, state)
+        self.state = state
+        metrics.inc('model_circuit_transitions_total', help='Circuit breaker state changes', state=state)
+
+
+class LatencyWindow:
+    """Recent successful attempt latencies, for the hedging threshold"""
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q):
+        """The q-quantile, or None until min_samples have been seen"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientModel:
+    """A model backend with deadlines, hedging, retries and a circuit breaker"""
+
+    def __init__(self, model, deadline=20.0, retries=2, backoff=0.25, max_backoff=2.0,
+                 hedge_quantile=0.95, hedge_min_delay=0.25, breaker=None, max_workers=32):
+        self.model = model
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_quantile = hedge_quantile  # 0 turns hedging off
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._latency = {'image': LatencyWindow(), 'text': LatencyWindow()}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='model-call')
+
+    def __getattr__(self, name):
+        # Backend extras (StubModel.calls, structured_reply, ...) pass through
+        return getattr(self.model, name)
+
+    def generate_content(self, contents, stream=False, request_options=None, **kwargs):
+        kind = contents_kind(contents)
+        call = (contents, kind, dict(request_options or {}), kwargs)
+        if stream:
+            return self._generate_stream(*call)
+
+        deadline_at = time.monotonic() + self.deadline
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                metrics.inc('model_calls_total', help=CALLS_HELP, kind=kind, outcome='rejected')
+                raise ModelUnavailable('Model circuit is open')
+            try:
+                response = self._hedged_attempt(call, deadline_at)
+            except Exception as e:
+                error = e
+                if not is_retryable(e):
+                    # The upstream answered; the request itself was bad
+                    self.breaker.record_success()
+                    metrics.inc('model_calls_total', help=CALLS_HELP, kind=kind, outcome='error')
+                    raise
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+                metrics.inc('model_calls_total', help=CALLS_HELP, kind=kind, outcome='ok')
+                return response
+
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            if attempt == self.retries or time.monotonic() + delay >= deadline_at:
+                break
+            metrics.inc('model_retries_total', help='Model attempts retried after a transient failure',
+                        kind=kind)
+            time.sleep(delay)
+
+        outcome = 'timeout' if isinstance(error, ModelTimeout) else 'error'
+        metrics.inc('model_calls_total', help=CALLS_HELP, kind=kind, outcome=outcome)
+        raise error
+
+    def _hedged_attempt(self, call, deadline_at):
+        """One attempt, plus a hedge if it outlives the recent p95"""
+        kind = call[1]
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise ModelTimeout('Model deadline exceeded')
+        primary = self._pool.submit(self._call, call, remaining)
+        pending = [primary]
+
+        hedge_after = self._hedge_delay(kind)
+        if hedge_after is not None and hedge_after < remaining:
+            done, _ = wait(pending, timeout=hedge_after)
+            if not done:
+                metrics.inc('model_hedges_total', help='Hedged second requests by which reply came first',
+                            kind=kind, result='sent')
+                pending.append(self._pool.submit(self._call, call, deadline_at - time.monotonic()))
+
+        error = None
+        while pending:
+            done, _ = wait(pending, timeout=max(0, deadline_at - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                raise ModelTimeout('Model deadline exceeded')
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    if future is not primary:
+                        metrics.inc('model_hedges_total', kind=kind, result='won')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _call(self, call, timeout):
+        contents, kind, options, kwargs = call
+        started = time.perf_counter()
+        response = self.model.generate_content(contents, request_options=dict(options, timeout=timeout),
+                                               **kwargs)
+        self._latency[kind].add(time.perf_counter() - started)
+        return response
+
+    def _hedge_delay(self, kind):
+        if not self.hedge_quantile:
+            return None
+        p = self._latency[kind].quantile(self.hedge_quantile)
+        return None if p is None else max(p, self.hedge_min_delay)
+
+    def _generate_stream(self, contents, kind, options, kwargs):
+        """Streaming calls get the breaker and a deadline, not hedges or retries"""
+        if not self.breaker.allow():
+            metrics.inc('model_calls_total', help=CALLS_HELP, kind=kind, outcome='rejected')
+            raise ModelUnavailable('Model circuit is open')
+        try:
+            response = self.model.generate_content(
+                contents, stream=True, request_options=dict(options, timeout=self.deadline), **kwargs)
+        except Exception as e:
+            self._record_failure(kind, e)
+            raise
+        return self._iterate(response, kind)
+
+    def _iterate(self, response, kind):
+        try:
+            for chunk in response:
+                yield chunk
+        except Exception as e:
+            self._record_failure(kind, e)
+            raise
+        self.breaker.record_success()
+        metrics.inc('model_calls_total', help=CALLS_HELP, kind=kind, outcome='ok')
+
+    def _record_failure(self, kind, error):
+        if is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        metrics.inc('model_calls_total', help=CALLS_HELP, kind=kind, outcome='error')
@@ -0,0 +1,166 @@
+import re
+import threading
+from collections import defaultdict
+
+from medicine_cache import normalize_name
+
+# Strength and dosage-form noise the vision model adds around a name,
+# e.g. "AZEE-500 Tablets" or "Dolo 650mg Tab"
+STRENGTH = re.compile(r'\b\d+(\.\d+)?\s*(mg|mcg|g|ml|iu|%)?\b', re.I)
+FORM_WORDS = {
+    'tablet', 'tablets', 'tab', 'tabs', 'capsule', 'capsules', 'cap', 'caps',
+    'syrup', 'suspension', 'injection', 'drops', 'cream', 'gel', 'ointment',
+    'strip', 'ip', 'bp', 'usp', 'mg', 'ml'
+}
+
+# A fuzzy match must be a typo of the indexed name: at most one edit for
+# names up to SHORT_NAME_LENGTH characters, two for longer ones, only
+# inside words of MIN_TYPO_WORD letters or more, and never in a word's first
+# letter. Prednisone/Prednisolone (2 edits), Dapagliflozin/Empagliflozin
+# (first letter), Vitamin K/C and B6/B12 (short words, digits) are
+# different medicines, not typos.
+SHORT_NAME_LENGTH = 12
+MIN_TYPO_WORD = 4
+
+
+def clean_model_name(raw_name):
+    """Reduce a raw vision answer to the words that name the medicine"""
+    name = normalize_name(STRENGTH.sub(' ', normalize_name(raw_name)))
+    words = [w for w in name.split() if w not in FORM_WORDS]
+    return ' '.join(words)
+
+
+def strip_strength(raw_name):
+    """raw_name without strength and dosage form, spelling kept:
+    "Levopalm 500 Tab" -> "Levopalm"
+    """
+    words = [w for w in STRENGTH.sub(' ', raw_name).split() if normalize_name(w) not in FORM_WORDS]
+    return ' '.join(words) or raw_name
+
+
+def edit_distance(a, b):
+    """Levenshtein distance"""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def is_typo_of(key, indexed_key, same_start=True):
+    """True when cleaned `key` is a misspelling of `indexed_key`
+
+    same_start=False also allows edits in a word's first letter.
+    """
+    words, indexed_words = key.split(), indexed_key.split()
+    if len(words) != len(indexed_words):
+        return False
+    edits = 0
+    for word, indexed_word in zip(words, indexed_words):
+        if word == indexed_word:
+            continue
+        if (min(len(word), len(indexed_word)) < MIN_TYPO_WORD
+                or (same_start and word[0] != indexed_word[0])
+                or not (word + indexed_word).isalpha()):
+            return False
+        edits += edit_distance(word, indexed_word)
+    return edits <= (1 if len(indexed_key) <= SHORT_NAME_LENGTH else 2)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Trigram inverted index mapping noisy names to canonical medicines.
+
+    Candidates are gathered from the posting lists of the query's trigrams
+    and scored with the Dice coefficient, 2|A&B| / (|A| + |B|), which is the
+    confidence returned by match(). An exact cleaned key scores 1.0; other
+    candidates must be a typo of exactly one medicine (is_typo_of).
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._canonical = []
+        self._grams = []
+        self._ids = {}
+        self._postings = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, name, canonical=None):
+        key = clean_model_name(name)
+        if not key:
+            return
+        with self._lock:
+            if key in self._ids:
+                return
+            doc_id = len(self._canonical)
+            grams = trigrams(key)
+            self._ids[key] = doc_id
+            self._keys.append(key)
+            # Without a canonical name (past scans), never carry a strength
+            # over to a scan of another strength
+            self._canonical.append(canonical or strip_strength(name))
+            self._grams.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(doc_id)
+
+    def match(self, raw_name, min_score=0.5):
+        """Return (canonical_name, confidence), or (None, best score)
+
+        Only indexed names scoring at least `min_score` are checked for
+        being a typo of `raw_name`, and exactly one medicine must pass.
+        """
+        key = clean_model_name(raw_name)
+        if not key:
+            return None, 0.0
+
+        doc_id = self._ids.get(key)
+        if doc_id is not None:
+            return self._canonical[doc_id], 1.0
+
+        query = trigrams(key)
+        shared = defaultdict(int)
+        for gram in query:
+            for doc_id in self._postings.get(gram, ()):
+                shared[doc_id] += 1
+        if not shared:
+            return None, 0.0
+
+        # Brand keys share their generic's canonical name, so count names.
+        # A medicine one edit away in the first letter still makes the
+        # match ambiguous: "lonazepam" is Clonazepam as much as Lorazepam.
+        best_score, typos, near = 0.0, {}, set()
+        for doc_id, count in shared.items():
+            score = 2.0 * count / (len(query) + self._grams[doc_id])
+            best_score = max(best_score, score)
+            if score < min_score or not is_typo_of(key, self._keys[doc_id], same_start=False):
+                continue
+            name = self._canonical[doc_id]
+            near.add(name)
+            if is_typo_of(key, self._keys[doc_id]):
+                typos[name] = max(score, typos.get(name, 0.0))
+        if len(near) == 1 and typos:
+            name, score = typos.popitem()
+            return name, round(score, 3)
+        return None, round(best_score, 3)
+
+    def __len__(self):
+        return len(self._canonical)
+
+
+def build_name_index(catalog, history_names=()):
+    """Index catalog generic/brand names and previously scanned names"""
+    index = NameIndex()
+    for entry in catalog.entries:
+        index.add(entry['medicine_name'], entry['medicine_name'])
+    for key, entry in catalog.index.items():
+        index.add(key, entry['medicine_name'])
+    for name in history_names:
+        index.add(name)
+    return index
@@ -0,0 +1,73 @@
+import threading
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def is_degenerate(phash, min_bits=8):
+    """True for hashes with fewer than `min_bits` set or clear bits.
+
+    Flat, dark or low-texture images hash to all (or nearly all) zeros, so
+    they all look like near-duplicates of each other.
+    """
+    ones = int(phash, 16).bit_count()
+    return ones < min_bits or len(phash) * 4 - ones < min_bits
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit perceptual hashes.
+
+    Each child hangs off its parent by Hamming distance, so a search for
+    everything within `radius` of a hash only descends into children whose
+    edge distance is within `radius` of the distance to the parent (the
+    triangle inequality) and skips the rest of the tree.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, phash, item):
+        """Index `item` under a hex perceptual hash"""
+        value = int(phash, 16)
+        with self._lock:
+            if self._root is None:
+                self._root = [value, [item], {}]
+                self._size += 1
+                return
+            node = self._root
+            while True:
+                distance = hamming(value, node[0])
+                if distance == 0:
+                    if item not in node[1]:
+                        node[1].append(item)
+                        self._size += 1
+                    return
+                child = node[2].get(distance)
+                if child is None:
+                    node[2][distance] = [value, [item], {}]
+                    self._size += 1
+                    return
+                node = child
+
+    def search(self, phash, radius):
+        """[(distance, item)] within `radius` bits, nearest first"""
+        value = int(phash, 16)
+        found = []
+        with self._lock:
+            stack = [self._root] if self._root else []
+            while stack:
+                node = stack.pop()
+                distance = hamming(value, node[0])
+                if distance <= radius:
+                    found.extend((distance, item) for item in node[1])
+                for edge, child in node[2].items():
+                    if distance - radius <= edge <= distance + radius:
+                        stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import time
+
+# Scan results live server-side in the scan_results table and are referenced
+# by a short id, so the session cookie carries a few bytes instead of the
+# whole result. The id is derived from the result itself, so repeated scans
+# of the same image reuse one row and one URL. detection_method is left out
+# of the id: it says how this particular scan was answered ("AI Recognition"
+# the first time, "AI Recognition (cached)" after), not what the result is.
+# The stored row keeps the first scan's value.
+
+ID_LENGTH = 16
+UNHASHED_FIELDS = ('detection_method',)
+
+
+def result_id(result):
+    """Short, stable id for a result dict"""
+    hashed = {key: value for key, value in result.items() if key not in UNHASHED_FIELDS}
+    payload = json.dumps(hashed, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:ID_LENGTH]
+
+
+def init_results_db(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS scan_results
+                    (id TEXT PRIMARY KEY,
+                     result TEXT NOT NULL,
+                     created_at REAL NOT NULL)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_scan_results_created
+                    ON scan_results (created_at)''')
+
+
+class ResultStore:
+    """Scan results in SQLite, expired after `ttl` seconds"""
+
+    def __init__(self, connect, ttl=30 * 24 * 3600):
+        self.connect = connect
+        self.ttl = ttl
+
+    def save(self, result):
+        """Store a result and return its id"""
+        conn = self.connect()
+        rid = self.add(conn, result)
+        conn.commit()
+        return rid
+
+    def add(self, conn, result):
+        """Store a result as part of the caller's transaction and return its id"""
+        rid = result_id(result)
+        now = time.time()
+        conn.execute('DELETE FROM scan_results WHERE created_at < ?', (now - self.ttl,))
+        # Re-saving an existing result refreshes its expiry
+        conn.execute('''INSERT INTO scan_results (id, result, created_at) VALUES (?, ?, ?)
+                        ON CONFLICT(id) DO UPDATE SET created_at = excluded.created_at''',
+                     (rid, json.dumps(result, ensure_ascii=False), now))
+        return rid
+
+    def get(self, rid):
+        """Return the stored result, or None if unknown or expired"""
+        conn = self.connect()
+        row = conn.execute('SELECT result, created_at FROM scan_results WHERE id = ?',
+                           (rid,)).fetchone()
+        if not row or time.time() - row['created_at'] > self.ttl:
+            return None
+        return json.loads(row['result'])
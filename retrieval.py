@@ -0,0 +1,194 @@
+import logging
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+# Model the bundled 384-d index was built with (vectors are L2-normalized)
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'can', 'do', 'does', 'for', 'how', 'i', 'in', 'is',
+    'it', 'me', 'my', 'of', 'on', 'or', 'should', 'the', 'to', 'what', 'when',
+    'which', 'with', 'about', 'take', 'tell'
+}
+
+
+def read_flat_index(path):
+    """Memory-map the vectors of a faiss IndexFlat file without faiss.
+
+    Layout: 4-byte fourcc, int32 d, int64 ntotal, two int64 dummies,
+    bool is_trained, int32 metric, int64 count, then count float32 values.
+    """
+    header = np.dtype([('fourcc', 'S4'), ('d', '<i4'), ('ntotal', '<i8'),
+                       ('dummy1', '<i8'), ('dummy2', '<i8'), ('is_trained', 'u1'),
+                       ('metric', '<i4'), ('count', '<i8')])
+    info = np.fromfile(path, dtype=header, count=1)[0]
+    if info['fourcc'] not in (b'IxF2', b'IxFI'):
+        raise ValueError(f"Unsupported faiss index type {info['fourcc']!r}")
+    d, ntotal = int(info['d']), int(info['ntotal'])
+    vectors = np.memmap(path, dtype='<f4', mode='r', offset=header.itemsize, shape=(ntotal, d))
+    return vectors, int(info['metric'])
+
+
+def tokenize(text):
+    """Lowercase word stems used by the keyword fallback"""
+    tokens = []
+    for word in re.findall(r'[a-z0-9]+', text.lower()):
+        if word in STOPWORDS:
+            continue
+        for suffix in ('ing', 'ed', 'es', 's'):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+                word = word[:-len(suffix)]
+                break
+        tokens.append(word)
+    return tokens
+
+
+# Words a plain lookup may use besides the medicine's name: the document
+# sections, and a few ways of asking for all of them
+LOOKUP_TERMS = set(tokenize('brand category use uses used dosage dose precautions warnings side effects '
+                            'food restrictions info information details medicine tablet drug'))
+
+
+def format_document(document):
+    """Put each "Label: value." section of a document on its own line"""
+    return re.sub(r'\.\s+(?=[A-Z][A-Za-z ]+:)', '\n', document.strip())
+
+
+def document_names(document):
+    """Medicine and brand names a document is about"""
+    return [name.strip().lower() for name in
+            re.findall(r'(?:Medicine|Brand):\s*([^.]+)\.', document)]
+
+
+def mentions_medicine(query, document):
+    """True when the query names the document's medicine or brand"""
+    words = set(re.findall(r'[a-z0-9]+', query.lower()))
+    return any(set(name.split()) <= words for name in document_names(document))
+
+
+def is_plain_lookup(query, document):
+    """True when the query names the document's medicine and asks for
+    nothing but its sections ("what is X", "X side effects"), which the
+    document answers as a whole. Questions like "X overdose what to do"
+    need the model.
+    """
+    if not mentions_medicine(query, document):
+        return False
+    names = {token for name in document_names(document) for token in tokenize(name)}
+    return set(tokenize(query)) - names <= LOOKUP_TERMS
+
+
+class MedicineRetriever:
+    """Top-k retrieval over the bundled medicine documents.
+
+    With numpy and sentence-transformers available, queries are embedded and
+    searched against the faiss index (or a NumPy brute-force scan over the
+    memory-mapped vectors when faiss is missing). Scores are cosine
+    similarities. Without an embedder, an IDF-weighted keyword match is used
+    instead; its score is the share of query weight found in the document.
+    The vector backends are optional; see requirements-vector.txt.
+    """
+
+    def __init__(self, index_path, documents_path, embedding_model=EMBEDDING_MODEL):
+        with open(documents_path, 'rb') as f:
+            self.documents = pickle.load(f)
+
+        self.embedding_model = embedding_model
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+        self.index = None
+        self.vectors = None
+        self.backend = 'keyword'
+
+        if np is not None and SentenceTransformer is not None and os.path.exists(index_path):
+            try:
+                if faiss is not None:
+                    try:
+                        self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+                    except RuntimeError:
+                        # Not every index type can be memory-mapped
+                        self.index = faiss.read_index(index_path)
+                    self.backend = 'faiss'
+                else:
+                    self.vectors, _ = read_flat_index(index_path)
+                    self.backend = 'numpy'
+            except Exception as e:
+                logger.warning('Vector index load error: %s', e)
+
+        # Keyword fallback, always built since it is tiny
+        self._doc_tokens = [Counter(tokenize(doc)) for doc in self.documents]
+        df = Counter(token for tokens in self._doc_tokens for token in tokens)
+        n = len(self.documents)
+        self._idf = {token: math.log(1 + n / count) for token, count in df.items()}
+        # A word no document uses is as specific as the rarest one, and the
+        # documents can't answer it: "paracetamol overdose" is not a
+        # paracetamol lookup
+        self._unknown_idf = math.log(1 + n)
+
+    def search(self, query, k=3):
+        """Return up to k (score, document) pairs, best first"""
+        if not self.documents:
+            return []
+        if self.backend == 'keyword':
+            return self._keyword_search(query, k)
+
+        query_vector = self._encode(query)
+        k = min(k, len(self.documents))
+        if self.backend == 'faiss':
+            distances, ids = self.index.search(query_vector.reshape(1, -1), k)
+            distances, ids = distances[0], ids[0]
+        else:
+            diffs = self.vectors - query_vector
+            all_distances = np.einsum('ij,ij->i', diffs, diffs)
+            ids = np.argsort(all_distances)[:k]
+            distances = all_distances[ids]
+
+        # Squared L2 between unit vectors -> cosine similarity
+        return [(float(1 - dist / 2), self.documents[i])
+                for dist, i in zip(distances, ids) if i >= 0]
+
+    def _encode(self, text):
+        if self._encoder is None:
+            # Loading takes seconds; concurrent first queries wait for one load
+            with self._encoder_lock:
+                if self._encoder is None:
+                    self._encoder = SentenceTransformer(self.embedding_model)
+        vector = self._encoder.encode([text], normalize_embeddings=True)[0]
+        return np.asarray(vector, dtype='float32')
+
+    def _keyword_search(self, query, k):
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        # Section words ("use", "info") are not content the documents lack
+        total = sum(self._idf.get(t, 0.0 if t in LOOKUP_TERMS else self._unknown_idf) for t in terms)
+        if not total:
+            return []
+        scored = []
+        for doc, tokens in zip(self.documents, self._doc_tokens):
+            matched = sum(self._idf[t] for t in terms if t in tokens)
+            if matched:
+                scored.append((matched / total, doc))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return scored[:k]
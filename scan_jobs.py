@@ -0,0 +1,159 @@
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Job states: queued -> running -> done | failed
+# A job still unfinished after its timeout is reported as failed.
+FINISHED = ('done', 'failed')
+
+
+class MemoryJobStore:
+    """Job records in a dict; only visible to the process that ran them"""
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, deadline):
+        now = time.time()
+        with self._lock:
+            # Drop jobs older than the TTL
+            for old_id in [j for j, job in self._jobs.items() if now - job['created_at'] > self.ttl]:
+                del self._jobs[old_id]
+            self._jobs[job_id] = {'status': 'queued', 'result': None, 'error': None,
+                                  'created_at': now, 'deadline': deadline}
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+class SqliteJobStore:
+    """Job records in the scan_jobs table, shared by every worker process"""
+
+    def __init__(self, connect, ttl=3600):
+        self.connect = connect
+        self.ttl = ttl
+
+    def create(self, job_id, deadline):
+        now = time.time()
+        conn = self.connect()
+        conn.execute('DELETE FROM scan_jobs WHERE created_at < ?', (now - self.ttl,))
+        conn.execute('''INSERT INTO scan_jobs (id, status, created_at, deadline)
+                        VALUES (?, 'queued', ?, ?)''', (job_id, now, deadline))
+        conn.commit()
+
+    def update(self, job_id, **fields):
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        columns = ', '.join(f"{key} = ?" for key in fields)
+        conn = self.connect()
+        conn.execute(f'UPDATE scan_jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+        conn.commit()
+
+    def get(self, job_id):
+        conn = self.connect()
+        row = conn.execute('''SELECT status, result, error, created_at, deadline
+                              FROM scan_jobs WHERE id = ?''', (job_id,)).fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+
+def init_jobs_db(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS scan_jobs
+                    (id TEXT PRIMARY KEY,
+                     status TEXT NOT NULL,
+                     result TEXT,
+                     error TEXT,
+                     created_at REAL NOT NULL,
+                     deadline REAL NOT NULL)''')
+
+
+class ScanJobQueue:
+    """Bounded pool of scan workers.
+
+    At most `max_depth` jobs may be queued or running; submit() raises
+    queue.Full beyond that so callers can shed load instead of piling up.
+    """
+
+    def __init__(self, store, workers=4, max_depth=32, timeout=60):
+        self.store = store
+        self.timeout = timeout
+        self.max_depth = max_depth
+        self._slots = threading.BoundedSemaphore(max_depth)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, cleanup=None):
+        """Queue fn(*args) and return a job id
+
+        cleanup() runs once the job is over, whether fn ran, failed or was
+        skipped because the job expired in the queue.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise queue.Full('Scan queue is full')
+
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._pending += 1
+        try:
+            self.store.create(job_id, time.time() + self.timeout)
+            self._executor.submit(self._run, job_id, fn, args, cleanup)
+        except Exception:
+            self._release()
+            raise
+        return job_id
+
+    def get(self, job_id):
+        job = self.store.get(job_id)
+        if job and job['status'] not in FINISHED and time.time() > job['deadline']:
+            job['status'] = 'failed'
+            job['error'] = 'Scan timed out'
+        return job
+
+    def depth(self):
+        with self._lock:
+            return self._pending
+
+    def _run(self, job_id, fn, args, cleanup):
+        try:
+            job = self.store.get(job_id)
+            if job and time.time() > job['deadline']:
+                # Waited in the queue past its timeout; nobody is polling any more
+                self.store.update(job_id, status='failed', error='Scan timed out')
+                return
+            self.store.update(job_id, status='running')
+            result = fn(*args)
+            self.store.update(job_id, status='done', result=result)
+        except Exception as e:
+            logger.warning('Scan job %s failed: %s', job_id, e)
+            self.store.update(job_id, status='failed', error=str(e))
+        finally:
+            if cleanup:
+                try:
+                    cleanup()
+                except Exception as e:
+                    logger.warning('Scan job %s cleanup failed: %s', job_id, e)
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
@@ -0,0 +1,48 @@
+import threading
+from concurrent.futures import Future
+
+import metrics
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for that result (or exception) instead of repeating
+    the work. Nothing is kept once the call finishes - caching is the
+    caller's job.
+    """
+
+    def __init__(self, group):
+        self.group = group
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        metrics.inc('singleflight_calls_total', help='Calls through single-flight groups; '
+                    'role="follower" ones were coalesced into an in-flight call',
+                    group=self.group, role='leader' if leader else 'follower')
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -97,18 +97,13 @@ if (scanBtn) {
             
             const data = await response.json();
             
-            if (response.ok) {
-                // Redirect to result page
-                if (data.redirect_url) {
-                    window.location.href = data.redirect_url;
-                } else {
-                    // Fallback: use medicine name if redirect_url not provided
-                    const medicineName = data.medicine_name || 'Medicine';
-                    window.location.href = `/result?medicine_name=${encodeURIComponent(medicineName)}`;
-                }
-            } else {
+            if (!response.ok) {
                 throw new Error(data.error || 'Upload failed. Please try again.');
             }
+            
+            // Scan runs in the background - wait for the job to finish
+            const result = data.job_id ? await waitForScan(data) : data;
+            window.location.href = result.redirect || '/result';
         } catch (error) {
             console.error('Upload Error:', error);
             alert(`Upload failed: ${error.message}`);
@@ -121,6 +116,47 @@ if (scanBtn) {
     });
 }
 
+// Wait for a background scan job. The server only offers events_url when
+// its workers can hold a stream open cheaply; otherwise poll.
+function waitForScan(job) {
+    if (window.EventSource && job.events_url) {
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(job.events_url);
+            source.addEventListener('status', (e) => {
+                const status = JSON.parse(e.data);
+                if (status.status === 'done') {
+                    source.close();
+                    resolve(status);
+                } else if (status.status === 'failed') {
+                    source.close();
+                    reject(new Error(status.error || 'Scan failed'));
+                }
+            });
+            source.onerror = () => {
+                // Stream dropped - fall back to polling
+                source.close();
+                pollScan(job.status_url).then(resolve, reject);
+            };
+        });
+    }
+    return pollScan(job.status_url);
+}
+
+async function pollScan(statusUrl, interval = 1000) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        const status = await response.json();
+        
+        if (!response.ok || status.status === 'failed') {
+            throw new Error(status.error || 'Scan failed');
+        }
+        if (status.status === 'done') {
+            return status;
+        }
+        await new Promise((r) => setTimeout(r, interval));
+    }
+}
+
 // Search Functionality
 if (searchBtn) {
     searchBtn.addEventListener('click', performSearch);
@@ -143,23 +179,23 @@ async function performSearch() {
         return;
     }
     
-    try {
-        // Option 1: Direct redirect to result page
+    if (!searchResults) {
         window.location.href = `/result?medicine_name=${encodeURIComponent(query)}`;
-        
-        // Option 2: If you want to show results on same page (uncomment below)
-        /*
-        // Show loading state
-        if (searchResults) {
-            searchResults.innerHTML = `
-                <div style="text-align: center; padding: 30px;">
-                    <div class="loading-spinner" style="width: 40px; height: 40px; border: 4px solid #f3f3f3; border-top: 4px solid #3498db; border-radius: 50%; margin: 0 auto 20px; animation: spin 1s linear infinite;"></div>
-                    <p>🧠 AI is analyzing your query...</p>
-                </div>
-            `;
-        }
-        
-        const response = await fetch('/search', {
+        return;
+    }
+    
+    searchResults.innerHTML = `
+        <div style="display: flex; align-items: center; gap: 10px; margin-bottom: 15px;">
+            <i class="fas fa-robot" style="color: #2a6ecc; font-size: 1.2rem;"></i>
+            <h4 style="margin: 0; color: #1a1a1a;">AI Response</h4>
+        </div>
+        <div id="searchAnswer" style="line-height: 1.6; white-space: pre-wrap;">🧠 AI is analyzing your query...</div>
+    `;
+    const answerBox = document.getElementById('searchAnswer');
+    
+    try {
+        // Stream the answer and render chunks as they arrive
+        const response = await fetch('/search/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -167,18 +203,41 @@ async function performSearch() {
             body: JSON.stringify({ query: query })
         });
         
-        const data = await response.json();
-        
-        if (response.ok && data.redirect_url) {
-            window.location.href = data.redirect_url;
-        } else {
+        if (!response.ok || !response.body) {
+            const data = await response.json().catch(() => ({}));
             throw new Error(data.error || 'Search failed');
         }
-        */
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Server-sent events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const raw = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                const eventName = (raw.match(/^event: (.*)$/m) || [])[1];
+                const data = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || '{}');
+                
+                if (eventName === 'chunk') {
+                    answer += data.text;
+                    answerBox.textContent = answer;
+                } else if (eventName === 'error') {
+                    throw new Error(data.error || 'Search failed');
+                }
+            }
+        }
         
     } catch (error) {
         console.error('Search error:', error);
-        alert(`Search failed: ${error.message}. Please try again.`);
         
         if (searchResults) {
             searchResults.innerHTML = `
@@ -0,0 +1,83 @@
+import pytest
+
+import db
+import migrations
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = db.connect(str(tmp_path / 'test.db'))
+    yield conn
+    conn.close()
+
+
+def create_baseline_schema(conn):
+    # The tables the app created at import time before schema_version existed
+    conn.execute('''CREATE TABLE users
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     username TEXT UNIQUE NOT NULL,
+                     email TEXT UNIQUE,
+                     password_hash TEXT NOT NULL,
+                     full_name TEXT,
+                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute('''CREATE TABLE scan_history
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     user_id INTEGER,
+                     medicine_name TEXT NOT NULL,
+                     image_url TEXT,
+                     category TEXT,
+                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute('''INSERT INTO users (username, email, password_hash, full_name)
+                    VALUES ('admin', 'admin@doseright.com', 'old-hash', 'Administrator')''')
+    conn.executemany('''INSERT INTO scan_history (user_id, medicine_name, timestamp)
+                        VALUES (?, ?, ?)''',
+                     [(1, 'Paracetamol', '2024-01-01 10:00:00'),
+                      (1, 'Azithromycin', '2024-01-02 10:00:00')])
+    conn.commit()
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def test_baseline_database_upgrades_to_latest(conn):
+    create_baseline_schema(conn)
+    assert migrations.current_version(conn) == 0
+
+    applied = migrations.migrate(conn)
+
+    assert [version for version, _ in applied] == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION
+    assert 'phash' in columns(conn, 'image_store')
+    # Existing rows survive and the stats table is backfilled from them
+    assert conn.execute('SELECT password_hash FROM users WHERE username = ?',
+                        ('admin',)).fetchone()[0] == 'old-hash'
+    stats = conn.execute('SELECT total_scans, last_scan FROM user_scan_stats WHERE user_id = 1').fetchone()
+    assert tuple(stats) == (2, '2024-01-02 10:00:00')
+
+
+def test_migrate_is_idempotent(conn):
+    create_baseline_schema(conn)
+    migrations.migrate(conn)
+    assert migrations.migrate(conn) == []
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION
+
+
+def test_only_pending_steps_are_applied(conn, monkeypatch):
+    create_baseline_schema(conn)
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:-1])
+    migrations.migrate(conn)
+    assert 'phash' not in columns(conn, 'image_store')
+    monkeypatch.undo()
+
+    applied = migrations.migrate(conn)
+
+    assert [version for version, _ in applied] == [migrations.LATEST_VERSION]
+    assert 'phash' in columns(conn, 'image_store')
+
+
+def test_stats_trigger_counts_new_scans(conn):
+    create_baseline_schema(conn)
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO scan_history (user_id, medicine_name) VALUES (1, 'Omeprazole')")
+    assert conn.execute('SELECT total_scans FROM user_scan_stats WHERE user_id = 1').fetchone()[0] == 3
@@ -0,0 +1,81 @@
+import pytest
+
+from model_client import CircuitBreaker, ModelUnavailable, ResilientModel
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_probe_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_probe_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0)
+    for _ in range(5):
+        breaker.record_failure()
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    breaker.reset_timeout = 60
+    assert not breaker.allow()
+
+
+class FailingModel:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def generate_content(self, contents, stream=False, request_options=None):
+        self.calls += 1
+        raise self.error
+
+
+def test_open_circuit_rejects_without_calling_model():
+    model = FailingModel(ConnectionError('upstream down'))
+    client = ResilientModel(model, retries=0, hedge_quantile=0,
+                            breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    with pytest.raises(ConnectionError):
+        client.generate_content('prompt')
+    with pytest.raises(ModelUnavailable):
+        client.generate_content('prompt')
+    assert model.calls == 1
+
+
+def test_bad_request_does_not_open_circuit():
+    model = FailingModel(ValueError('bad prompt'))
+    client = ResilientModel(model, retries=2, hedge_quantile=0,
+                            breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            client.generate_content('prompt')
+    assert model.calls == 2
+    assert client.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,72 @@
+import pytest
+
+from name_index import NameIndex, clean_model_name, edit_distance, strip_strength
+
+
+@pytest.fixture
+def index():
+    index = NameIndex()
+    for name in ['Paracetamol', 'Prednisolone', 'Omeprazole', 'Vitamin C', 'Vitamin B12',
+                 'Azithromycin', 'Amoxicillin', 'Empagliflozin']:
+        index.add(name, name)
+    index.add('Dolo', 'Paracetamol')
+    return index
+
+
+def test_clean_model_name_drops_strength_and_form():
+    assert clean_model_name('AZEE-500 Tablets') == 'azee'
+    assert clean_model_name('Dolo 650mg Tab') == 'dolo'
+
+
+def test_strip_strength_keeps_spelling():
+    assert strip_strength('Levopalm 500 Tab') == 'Levopalm'
+    assert strip_strength('LEVOPALM 500MG') == 'LEVOPALM'
+
+
+def test_edit_distance():
+    assert edit_distance('paracetamo', 'paracetamol') == 1
+    assert edit_distance('prednisone', 'prednisolone') == 2
+
+
+def test_exact_key_matches_through_strength_and_brand(index):
+    assert index.match('Paracetamol 500mg Tablets') == ('Paracetamol', 1.0)
+    assert index.match('DOLO-650') == ('Paracetamol', 1.0)
+
+
+@pytest.mark.parametrize('raw_name, expected', [
+    ('Azithromycn', 'Azithromycin'),
+    ('Amoxicilin 500mg', 'Amoxicillin'),
+    ('Paracetamo', 'Paracetamol'),
+])
+def test_typos_resolve(index, raw_name, expected):
+    assert index.match(raw_name)[0] == expected
+
+
+@pytest.mark.parametrize('raw_name', [
+    'Prednisone', 'Esomeprazole 40mg', 'Vitamin K', 'Vitamin D3', 'Vitamin B6', 'Dapagliflozin',
+])
+def test_sibling_medicines_are_not_remapped(index, raw_name):
+    canonical, confidence = index.match(raw_name)
+    assert canonical is None
+    assert confidence < 1.0
+
+
+def test_typo_of_two_medicines_is_ambiguous():
+    index = NameIndex()
+    index.add('Lorapam', 'Lorapam')
+    index.add('Lorazam', 'Lorazam')
+    assert index.match('Loraam')[0] is None
+
+
+def test_history_names_do_not_carry_strength():
+    index = NameIndex()
+    index.add('Levopalm 500')
+    assert index.match('Levopalm 750') == ('Levopalm', 1.0)
+
+
+def test_first_letter_neighbour_makes_match_ambiguous():
+    index = NameIndex()
+    index.add('Clonazepam', 'Clonazepam')
+    index.add('Lorazepam', 'Lorazepam')
+    assert index.match('lonazepam')[0] is None
+    assert index.match('Lorazepan')[0] == 'Lorazepam'
@@ -0,0 +1,55 @@
+import random
+
+from phash_index import BKTree, hamming, is_degenerate
+
+
+def flip(phash, bits):
+    """`phash` with the given bit positions inverted"""
+    value = int(phash, 16)
+    for bit in bits:
+        value ^= 1 << bit
+    return f'{value:016x}'
+
+
+def test_search_respects_radius():
+    tree = BKTree()
+    base = '0f0f0f0f0f0f0f0f'
+    tree.add(base, 'same')
+    tree.add(flip(base, [0, 1]), 'two')
+    tree.add(flip(base, range(10)), 'ten')
+    assert tree.search(base, 0) == [(0, 'same')]
+    assert tree.search(base, 2) == [(0, 'same'), (2, 'two')]
+    assert tree.search(base, 9) == [(0, 'same'), (2, 'two')]
+    assert tree.search(base, 10) == [(0, 'same'), (2, 'two'), (10, 'ten')]
+
+
+def test_search_matches_brute_force():
+    rng = random.Random(7)
+    hashes = [f'{rng.getrandbits(64):016x}' for _ in range(300)]
+    # Near neighbours of the first few, so small radii find something
+    hashes += [flip(h, rng.sample(range(64), rng.randint(1, 8))) for h in hashes[:50]]
+    tree = BKTree()
+    for i, h in enumerate(hashes):
+        tree.add(h, i)
+
+    for query in hashes[:20]:
+        for radius in (0, 4, 8, 24):
+            expected = sorted(i for i, h in enumerate(hashes)
+                              if hamming(int(query, 16), int(h, 16)) <= radius)
+            assert sorted(item for _, item in tree.search(query, radius)) == expected
+
+
+def test_duplicate_items_counted_once():
+    tree = BKTree()
+    tree.add('00000000ffffffff', 'a')
+    tree.add('00000000ffffffff', 'a')
+    tree.add('00000000ffffffff', 'b')
+    assert len(tree) == 2
+    assert BKTree().search('00000000ffffffff', 64) == []
+
+
+def test_is_degenerate():
+    assert is_degenerate('0000000000000000')
+    assert is_degenerate('ffffffffffffffff')
+    assert is_degenerate('0000000000000070')
+    assert not is_degenerate('0f0f0f0f0f0f0f0f')
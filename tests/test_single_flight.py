@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+import single_flight
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_the_leaders_exception(monkeypatch):
+    # Release the leader only once the follower has joined its call
+    joined = threading.Event()
+    monkeypatch.setattr(single_flight.metrics, 'inc',
+                        lambda name, help=None, **labels: labels['role'] == 'follower' and joined.set())
+    flight = SingleFlight('test')
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise RuntimeError('upstream failed')
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('key', fail)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    assert joined.wait(5)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(calls) == 1
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.in_flight() == 0
+
+
+def test_failed_call_is_not_remembered():
+    flight = SingleFlight('test')
+
+    def fail():
+        raise RuntimeError('upstream failed')
+
+    with pytest.raises(RuntimeError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 'retried') == 'retried'
+    assert flight.in_flight() == 0
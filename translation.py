@@ -0,0 +1,112 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import time
+
+import metrics
+from medicine_cache import normalize_name
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+LANGUAGES = {'ta': 'Tamil'}
+
+TRANSLATE_PROMPT = """Translate the values of this JSON object about the medicine '{name}' into {language}.
+Keep medicine names, brand names, numbers and units as they are. Keep each value short.
+Reply with ONLY a JSON object with exactly the same keys, no other text.
+
+{fields}"""
+
+
+def source_hash(text):
+    """Short hash of the English text a translation was made from"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def init_translations_db(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS translations
+                    (name_key TEXT NOT NULL,
+                     field TEXT NOT NULL,
+                     lang TEXT NOT NULL,
+                     source_hash TEXT NOT NULL,
+                     text TEXT NOT NULL,
+                     created_at REAL NOT NULL,
+                     PRIMARY KEY (name_key, field, lang))''')
+
+
+class Translator:
+    """Field translations cached per (medicine, field, language).
+
+    A cached translation is only reused while the English text it was made
+    from is unchanged. All missing fields of a medicine are translated in
+    one model call through `generate(prompt) -> text`.
+    """
+
+    def __init__(self, connect, generate, lang='ta'):
+        self.connect = connect
+        self.generate = generate
+        self.lang = lang
+        self.language = LANGUAGES[lang]
+        self._flight = SingleFlight(f'translate_{lang}')
+
+    def lookup(self, medicine_name, fields):
+        """Split `fields` into (cached translations, fields still to translate)"""
+        key = normalize_name(medicine_name)
+        rows = {}
+        try:
+            conn = self.connect()
+            rows = {row['field']: row for row in conn.execute(
+                '''SELECT field, source_hash, text FROM translations
+                   WHERE name_key = ? AND lang = ?''', (key, self.lang))}
+        except sqlite3.Error as e:
+            logger.warning('Translation cache read error: %s', e)
+
+        found, missing = {}, {}
+        for field, text in fields.items():
+            row = rows.get(field)
+            if row and row['source_hash'] == source_hash(text):
+                found[field] = row['text']
+            else:
+                missing[field] = text
+        metrics.inc('translation_lookups_total', len(found), help='Translated fields by cache outcome',
+                    lang=self.lang, result='hit')
+        metrics.inc('translation_lookups_total', len(missing), lang=self.lang, result='miss')
+        return found, missing
+
+    def translate(self, medicine_name, fields):
+        """Translations for as many of `fields` as possible; never raises"""
+        found, missing = self.lookup(medicine_name, fields)
+        if missing:
+            flight_key = (normalize_name(medicine_name), tuple(sorted(missing.items())))
+            found.update(self._flight.do(flight_key, self._translate, medicine_name, missing))
+        return found
+
+    def _translate(self, medicine_name, fields):
+        try:
+            text = self.generate(TRANSLATE_PROMPT.format(
+                name=medicine_name, language=self.language,
+                fields=json.dumps(fields, ensure_ascii=False, indent=1)))
+            match = re.search(r'\{.*\}', text, re.S)
+            data = json.loads(match.group(0)) if match else {}
+        except Exception as e:
+            logger.warning('Translation failed for %s: %s', medicine_name, e)
+            metrics.inc('translation_failures_total', help='Translation calls that failed', lang=self.lang)
+            return {}
+
+        translated = {field: data[field].strip() for field in fields
+                      if isinstance(data.get(field), str) and data[field].strip()}
+        try:
+            now = time.time()
+            conn = self.connect()
+            conn.executemany('''INSERT OR REPLACE INTO translations
+                                (name_key, field, lang, source_hash, text, created_at)
+                                VALUES (?, ?, ?, ?, ?, ?)''',
+                             [(normalize_name(medicine_name), field, self.lang,
+                               source_hash(fields[field]), value, now)
+                              for field, value in translated.items()])
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning('Translation cache write error: %s', e)
+        return translated
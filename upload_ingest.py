@@ -0,0 +1,141 @@
+import hashlib
+import tempfile
+
+from flask import Request
+
+# Uploads are never read into memory whole. While the multipart body is
+# parsed, each file part is written in chunks into an UploadSpool, which
+# hashes it (the upload_store content hash) and keeps its first bytes for
+# type sniffing as the data goes by. Up to SPOOL_MAX_SIZE stays in memory;
+# anything larger rolls over to a temporary file on disk.
+#
+# A spool normally closes with its request. A view that hands the upload to
+# a scan job calls keep() so it survives, and the scan pipeline release()s
+# it as soon as the image has been downscaled, before any model call.
+
+SPOOL_MAX_SIZE = 256 * 1024
+CHUNK_SIZE = 64 * 1024
+HEAD_SIZE = 12
+
+
+def sniff_image_type(head):
+    """'jpeg', 'png' or 'webp' from a file's first bytes, else None"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class UploadSpool:
+    """Spooled temporary file that hashes and sniffs what is written to it"""
+
+    def __init__(self, max_size=SPOOL_MAX_SIZE):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_size)
+        self._sha256 = hashlib.sha256()
+        self._head = b''
+        self._kept = False
+        self.size = 0
+
+    @classmethod
+    def from_bytes(cls, data):
+        spool = cls()
+        spool.write(data)
+        spool.seek(0)
+        return spool
+
+    @classmethod
+    def copy_from(cls, stream, chunk_size=CHUNK_SIZE):
+        spool = cls()
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            spool.write(chunk)
+        spool.seek(0)
+        return spool
+
+    @property
+    def content_hash(self):
+        return self._sha256.hexdigest()
+
+    @property
+    def image_type(self):
+        return sniff_image_type(self._head)
+
+    # File interface, for the form parser and FileStorage
+    def write(self, data):
+        if len(self._head) < HEAD_SIZE:
+            self._head += data[:HEAD_SIZE - len(self._head)]
+        self._sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def open(self):
+        """The spooled data from the start, for Image.open"""
+        self._file.seek(0)
+        return self._file
+
+    def keep(self):
+        """Let the upload outlive its request; release() frees it"""
+        self._kept = True
+        return self
+
+    def close(self):
+        # Called when the request ends; kept uploads wait for release()
+        if not self._kept:
+            self.release()
+
+    def release(self):
+        self._file.close()
+
+
+class UploadRequest(Request):
+    """Request whose uploaded files are parsed straight into UploadSpools"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool()
+
+
+def take_upload(file):
+    """The kept UploadSpool behind a request file, or None if it is not an image"""
+    spool = file.stream
+    if not isinstance(spool, UploadSpool):
+        spool = UploadSpool.copy_from(spool)
+    if spool.image_type is None:
+        spool.release()
+        return None
+    spool.seek(0)
+    return spool.keep()
+
+
+def as_upload(data):
+    """An UploadSpool for raw bytes; spools pass through"""
+    return data if isinstance(data, UploadSpool) else UploadSpool.from_bytes(data)
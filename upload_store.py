@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import re
+
+from medicine_cache import normalize_name
+
+# Uploaded images are stored once per distinct payload, named by the
+# SHA-256 of the bytes the client sent: static/uploads/<sha256>.jpg,
+# with a small static/uploads/<sha256>_thumb.jpg for the history page
+HASHED_NAME = re.compile(r'^[0-9a-f]{64}(_thumb)?\.jpg$')
+
+
+def content_hash(data):
+    """SHA-256 hex digest of an uploaded file"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def stored_filename(digest):
+    return f"{digest}.jpg"
+
+
+def thumbnail_filename(digest):
+    return f"{digest}_thumb.jpg"
+
+
+def thumbnail_url(image_url):
+    """Thumbnail URL for a stored image URL, or the URL itself for legacy files"""
+    if image_url and HASHED_NAME.match(image_url.rsplit('/', 1)[-1]):
+        return image_url[:-len('.jpg')] + '_thumb.jpg'
+    return image_url
+
+
+def init_upload_store_db(conn):
+    """Create the hash -> identification table"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS image_store
+                    (content_hash TEXT PRIMARY KEY,
+                     image_url TEXT NOT NULL,
+                     medicine_name TEXT,
+                     medicine_info TEXT,
+                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+
+def lookup(conn, digest):
+    """Return the stored identification for a content hash, or None"""
+    row = conn.execute('''SELECT image_url, medicine_name, medicine_info
+                          FROM image_store WHERE content_hash = ?''',
+                       (digest,)).fetchone()
+    if not row:
+        return None
+    return {
+        'image_url': row['image_url'],
+        'medicine_name': row['medicine_name'],
+        'medicine_info': json.loads(row['medicine_info']) if row['medicine_info'] else None
+    }
+
+
+def record(conn, digest, image_url, medicine_name=None, medicine_info=None, phash=None):
+    """Insert or update the identification for a content hash"""
+    conn.execute('''INSERT INTO image_store (content_hash, image_url, medicine_name, medicine_info, phash)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(content_hash) DO UPDATE SET
+                        image_url = excluded.image_url,
+                        medicine_name = COALESCE(excluded.medicine_name, image_store.medicine_name),
+                        medicine_info = COALESCE(excluded.medicine_info, image_store.medicine_info),
+                        phash = COALESCE(excluded.phash, image_store.phash)''',
+                 (digest, image_url, medicine_name,
+                  json.dumps(medicine_info) if medicine_info else None, phash))
+
+
+def forget_info(conn, medicine_name=None):
+    """Drop stored info for one medicine, or all, keeping the names.
+
+    Those images are described afresh on their next scan. Returns the
+    number of rows changed; the caller commits.
+    """
+    if medicine_name is None:
+        return conn.execute('UPDATE image_store SET medicine_info = NULL '
+                            'WHERE medicine_info IS NOT NULL').rowcount
+    key = normalize_name(medicine_name)
+    names = [row[0] for row in conn.execute('''SELECT DISTINCT medicine_name FROM image_store
+                                               WHERE medicine_info IS NOT NULL''')
+             if normalize_name(row[0]) == key]
+    return sum(conn.execute('''UPDATE image_store SET medicine_info = NULL
+                               WHERE medicine_name = ?''', (name,)).rowcount for name in names)
+
+
+def add_phash_column(conn):
+    """Perceptual hash of each stored image, for near-duplicate matching"""
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(image_store)')]
+    if 'phash' not in columns:
+        conn.execute('ALTER TABLE image_store ADD COLUMN phash TEXT')
+
+
+def identified_phashes(conn):
+    """(phash, content_hash) for every stored image with a full identification"""
+    return conn.execute('''SELECT phash, content_hash FROM image_store
+                           WHERE phash IS NOT NULL AND medicine_info IS NOT NULL''').fetchall()
+
+
+def compact_uploads(conn, upload_folder, url_prefix='/static/uploads'):
+    """Fold legacy {timestamp}_{filename} uploads into the hashed layout.
+
+    Every legacy file is renamed to <sha256>.jpg, or deleted if that hash is
+    already stored. scan_history rows are repointed at the surviving file and
+    the most recent medicine name seen for it is recorded in image_store.
+    """
+    stats = {'scanned': 0, 'moved': 0, 'removed': 0, 'bytes_freed': 0}
+
+    for name in sorted(os.listdir(upload_folder)):
+        path = os.path.join(upload_folder, name)
+        if not os.path.isfile(path) or HASHED_NAME.match(name):
+            continue
+        stats['scanned'] += 1
+
+        with open(path, 'rb') as f:
+            digest = content_hash(f.read())
+
+        target_name = stored_filename(digest)
+        target_path = os.path.join(upload_folder, target_name)
+        if os.path.exists(target_path):
+            stats['bytes_freed'] += os.path.getsize(path)
+            os.remove(path)
+            stats['removed'] += 1
+        else:
+            os.rename(path, target_path)
+            stats['moved'] += 1
+
+        old_url = f"{url_prefix}/{name}"
+        new_url = f"{url_prefix}/{target_name}"
+        conn.execute('UPDATE scan_history SET image_url = ? WHERE image_url = ?',
+                     (new_url, old_url))
+
+        latest = conn.execute('''SELECT medicine_name FROM scan_history
+                                 WHERE image_url = ? ORDER BY timestamp DESC LIMIT 1''',
+                              (new_url,)).fetchone()
+        record(conn, digest, new_url, latest['medicine_name'] if latest else None)
+
+    conn.commit()
+    return stats